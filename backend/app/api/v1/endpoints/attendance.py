@@ -3,19 +3,25 @@ Attendance API routes
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 from datetime import date, datetime
 
 from app.core.database import get_db
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.models.attendance import Attendance
 from app.models.student import Student
 from app.models.camera import Camera
 from app.schemas.attendance import AttendanceCreate, AttendanceResponse, AttendanceWithStudent, AttendanceStats
-from sqlalchemy import func, and_
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 router = APIRouter()
 
+# Dashboards poll /stats every few seconds; the aggregate only needs to be near-real-time
+_stats_cache = TTLCache(ttl=settings.STATS_CACHE_TTL)
+
 
 @router.get("/", response_model=List[AttendanceWithStudent])
 def get_attendance(
@@ -27,7 +33,11 @@ def get_attendance(
     db: Session = Depends(get_db)
 ):
     """Get attendance records"""
-    query = db.query(Attendance).join(Student)
+    # Eager-load student and camera in the same round trip (avoids N+1 lazy loads)
+    query = db.query(Attendance).options(
+        joinedload(Attendance.student, innerjoin=True),
+        joinedload(Attendance.camera)
+    )
     
     if date_filter:
         query = query.filter(Attendance.date == date_filter)
@@ -36,23 +46,9 @@ def get_attendance(
     if camera_id:
         query = query.filter(Attendance.camera_id == camera_id)
     
-    records = query.order_by(Attendance.time.desc()).offset(skip).limit(limit).all()
-    
-    # Format response
-    result = []
-    for record in records:
-        camera_name = None
-        if record.camera:
-            camera_name = record.camera.name
-        
-        result.append({
-            **record.__dict__,
-            'student_name': record.student.name,
-            'student_roll_number': record.student.roll_number,
-            'camera_name': camera_name
-        })
-    
-    return result
+    # response_model reads the student/camera fields off the already-loaded
+    # relationships (Attendance properties), serializing in a single pass
+    return query.order_by(Attendance.time.desc()).offset(skip).limit(limit).all()
 
 
 @router.get("/stats", response_model=AttendanceStats)
@@ -64,13 +60,26 @@ def get_attendance_stats(
     if date_filter is None:
         date_filter = date.today()
     
-    # Total active students
-    total_students = db.query(func.count(Student.id)).filter(Student.is_active == True).scalar() or 0
-    
-    # Students present today
-    present_today = db.query(func.count(func.distinct(Attendance.student_id))).filter(
-        Attendance.date == date_filter
-    ).scalar() or 0
+    return _stats_cache.get_or_set(date_filter, lambda: _compute_attendance_stats(db, date_filter))
+
+
+def _compute_attendance_stats(db: Session, date_filter: date) -> dict:
+    """Aggregate attendance statistics for a single day"""
+    # Active-student total and distinct students present, in one statement
+    stmt = select(
+        select(func.count())
+        .select_from(Student)
+        .where(Student.is_active.is_(True))
+        .scalar_subquery()
+        .label("total_students"),
+        select(func.count(func.distinct(Attendance.student_id)))
+        .where(Attendance.date == date_filter)
+        .scalar_subquery()
+        .label("present_today")
+    )
+    row = db.execute(stmt).one()
+    total_students = row.total_students or 0
+    present_today = row.present_today or 0
     
     absent_today = total_students - present_today
     attendance_percentage = (present_today / total_students * 100) if total_students > 0 else 0.0
@@ -92,29 +101,21 @@ def mark_attendance(attendance: AttendanceCreate, db: Session = Depends(get_db))
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Check if already marked for today
-    existing = db.query(Attendance).filter(
-        and_(
-            Attendance.student_id == attendance.student_id,
-            Attendance.date == attendance.date
-        )
-    ).first()
-    
-    if existing:
-        # Update existing record
-        existing.time = attendance.time
-        existing.camera_id = attendance.camera_id
-        existing.confidence = attendance.confidence
-        existing.status = attendance.status
-        db.commit()
-        db.refresh(existing)
-        return existing
+    # Insert, or update the existing record for that day, in one atomic statement
+    stmt = pg_insert(Attendance).values(**attendance.model_dump())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Attendance.student_id, Attendance.date],
+        set_={
+            'time': stmt.excluded.time,
+            'camera_id': stmt.excluded.camera_id,
+            'confidence': stmt.excluded.confidence,
+            'status': stmt.excluded.status
+        }
+    ).returning(Attendance)
     
-    # Create new attendance record
-    db_attendance = Attendance(**attendance.dict())
-    db.add(db_attendance)
+    db_attendance = db.scalars(stmt, execution_options={"populate_existing": True}).one()
     db.commit()
-    db.refresh(db_attendance)
+    _stats_cache.clear()
     return db_attendance
 
 
@@ -134,4 +135,5 @@ def delete_attendance(attendance_id: int, db: Session = Depends(get_db)):
     
     db.delete(attendance)
     db.commit()
+    _stats_cache.clear()
     return {"message": "Attendance record deleted successfully"}
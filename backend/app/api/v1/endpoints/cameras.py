@@ -5,11 +5,14 @@ Camera API routes
 from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from typing import List
 import cv2
 import numpy as np
+import time
 
 from app.core.database import get_db
+from app.core.config import settings
 from app.models.camera import Camera
 from app.schemas.camera import CameraCreate, CameraUpdate, CameraResponse
 from app.services.video_service import VideoCapture
@@ -17,6 +20,16 @@ from app.services.camera_runner import get_camera_manager
 
 router = APIRouter()
 
+_JPEG_PARAMS = [
+    cv2.IMWRITE_JPEG_QUALITY, settings.SNAPSHOT_JPEG_QUALITY,
+    cv2.IMWRITE_JPEG_OPTIMIZE, 1
+]
+
+
+def _ip_address_taken(db: Session, ip_address: str) -> bool:
+    """Check whether a camera with this IP address exists without loading it"""
+    return db.scalar(select(Camera.id).where(Camera.ip_address == ip_address).exists().select())
+
 
 @router.get("/", response_model=List[CameraResponse])
 def get_cameras(
@@ -73,11 +86,10 @@ def get_camera(camera_id: int, db: Session = Depends(get_db)):
 def create_camera(camera: CameraCreate, db: Session = Depends(get_db)):
     """Create new camera"""
     # Check if IP address already exists
-    existing = db.query(Camera).filter(Camera.ip_address == camera.ip_address).first()
-    if existing:
+    if _ip_address_taken(db, camera.ip_address):
         raise HTTPException(status_code=400, detail="Camera with this IP address already exists")
     
-    db_camera = Camera(**camera.dict())
+    db_camera = Camera(**camera.model_dump())
     db.add(db_camera)
     db.commit()
     db.refresh(db_camera)
@@ -97,12 +109,11 @@ def update_camera(
     
     # Check if IP address is being updated and already exists
     if camera_update.ip_address and camera_update.ip_address != camera.ip_address:
-        existing = db.query(Camera).filter(Camera.ip_address == camera_update.ip_address).first()
-        if existing:
+        if _ip_address_taken(db, camera_update.ip_address):
             raise HTTPException(status_code=400, detail="Camera with this IP address already exists")
     
     # Update fields
-    update_data = camera_update.dict(exclude_unset=True)
+    update_data = camera_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(camera, field, value)
     
@@ -171,6 +182,25 @@ def test_camera_connection(camera: CameraCreate):
         )
 
 
+def _encode_jpeg(frame: np.ndarray, width: int, height: int) -> bytes:
+    """Optionally resize a frame and encode it as JPEG bytes"""
+    # Optional resize, skipped when the frame already has the requested size
+    if width and height and width > 0 and height > 0:
+        h, w = frame.shape[:2]
+        if (w, h) != (int(width), int(height)):
+            try:
+                frame = cv2.resize(frame, (int(width), int(height)), interpolation=cv2.INTER_AREA)
+            except Exception:
+                pass
+
+    # Encode to JPEG with pinned quality and optimized Huffman tables
+    success, buffer = cv2.imencode('.jpg', frame, _JPEG_PARAMS)
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to encode frame")
+
+    return buffer.tobytes()
+
+
 @router.get("/{camera_id}/snapshot")
 def get_camera_snapshot(
     camera_id: int,
@@ -180,36 +210,87 @@ def get_camera_snapshot(
 ):
     """Return a single JPEG snapshot from the specified camera.
 
-    Supports integer device indices (e.g., "0") or URL sources (HTTP/RTSP/file).
+    Reuses the latest frame of a running background worker when available;
+    otherwise opens the source directly. Supports integer device indices
+    (e.g., "0") or URL sources (HTTP/RTSP/file).
     """
     camera = db.query(Camera).filter(Camera.id == camera_id).first()
     if not camera:
         raise HTTPException(status_code=404, detail="Camera not found")
 
-    source = camera.ip_address
+    frame = get_camera_manager().latest_frame(camera_id)
 
-    # Try to open, read one frame, then close
-    with VideoCapture(source) as cap:
-        if not cap.is_opened:
-            raise HTTPException(status_code=503, detail=f"Unable to open camera source: {source}")
+    if frame is None:
+        source = camera.ip_address
 
-        frame = cap.read()
-        if frame is None:
-            raise HTTPException(status_code=504, detail="Failed to read frame from camera")
+        # Try to open, read one frame, then close
+        with VideoCapture(source) as cap:
+            if not cap.is_opened:
+                raise HTTPException(status_code=503, detail=f"Unable to open camera source: {source}")
 
-    # Optional resize
-    if width and height and width > 0 and height > 0:
-        try:
-            frame = cv2.resize(frame, (int(width), int(height)))
-        except Exception:
-            pass
+            frame = cap.read()
+            if frame is None:
+                raise HTTPException(status_code=504, detail="Failed to read frame from camera")
 
-    # Encode to JPEG
-    success, buffer = cv2.imencode('.jpg', frame)
-    if not success:
-        raise HTTPException(status_code=500, detail="Failed to encode frame")
+    return Response(
+        content=_encode_jpeg(frame, width, height),
+        media_type="image/jpeg",
+        headers={"Cache-Control": "max-age=1"}  # lets browser polling dedupe requests
+    )
+
+
+def _mjpeg_stream(camera_id: int, source: str, fps: float, width: int, height: int):
+    """Yield multipart JPEG parts, preferring frames from the background worker"""
+    manager = get_camera_manager()
+    interval = 1.0 / fps
+    cap = None
+    last_frame = None
+    jpeg = None
+
+    try:
+        while True:
+            frame = manager.latest_frame(camera_id)
+
+            if frame is None:
+                # No worker for this camera: keep one capture open for the whole stream
+                if cap is None:
+                    cap = VideoCapture(source)
+                    if not cap.open():
+                        break
+                frame = cap.read()
+                if frame is None:
+                    break
+
+            # Worker frames repeat between polls; only re-encode new ones
+            if frame is not last_frame:
+                jpeg = _encode_jpeg(frame, width, height)
+                last_frame = frame
+
+            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+            time.sleep(interval)
+    finally:
+        if cap is not None:
+            cap.close()
+
+
+@router.get("/{camera_id}/stream")
+def stream_camera(
+    camera_id: int,
+    fps: float = 5,
+    width: int = 640,
+    height: int = 480,
+    db: Session = Depends(get_db)
+):
+    """Stream the camera as MJPEG (multipart/x-mixed-replace)"""
+    camera = db.query(Camera).filter(Camera.id == camera_id).first()
+    if not camera:
+        raise HTTPException(status_code=404, detail="Camera not found")
 
-    return Response(content=buffer.tobytes(), media_type="image/jpeg")
+    fps = max(0.2, min(fps, 30))
+    return StreamingResponse(
+        _mjpeg_stream(camera_id, camera.ip_address, fps, width, height),
+        media_type="multipart/x-mixed-replace; boundary=frame"
+    )
 
 
 @router.post("/{camera_id}/start-bg")
@@ -3,21 +3,130 @@ Recognition API routes
 """
 
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+import logging
 import numpy as np
 import cv2
-from datetime import date, datetime
-import base64
 
 from app.core.database import get_db
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.models.student import Student
-from app.models.attendance import Attendance
-from app.schemas.attendance import AttendanceCreate
-from app.services.training_service import get_trainer
-from app.services.video_service import base64_to_frame, frame_to_base64
+from app.services.training_service import FaceRecognitionTrainer, get_trainer
+from app.services.video_service import base64_to_frame, bytes_to_frame
+from app.services.attendance_service import best_confidence_per_student, mark_students_present
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+_stats_cache = TTLCache(ttl=settings.STATS_CACHE_TTL)
+
+_MAX_UPLOAD_BYTES = settings.MAX_UPLOAD_SIZE_MB << 20
+
+
+def _decode_upload(contents: bytes):
+    """
+    Decode uploaded image bytes, downscaling so the long edge fits MAX_IMAGE_DIMENSION
+    
+    Args:
+        contents: Encoded image bytes
+        
+    Returns:
+        Tuple of (frame, scale) where scale maps original to decoded coordinates,
+        or (None, 1.0) if the bytes are not a valid image
+    """
+    frame = bytes_to_frame(contents)
+    if frame is None:
+        return None, 1.0
+    
+    h, w = frame.shape[:2]
+    scale = settings.MAX_IMAGE_DIMENSION / max(h, w)
+    if scale >= 1:
+        return frame, 1.0
+    
+    frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return frame, scale
+
+
+def _recognize(
+    trainer: FaceRecognitionTrainer,
+    frame: np.ndarray,
+    camera_id: int,
+    mark_attendance: bool,
+    db: Session,
+    bbox_scale: float = 1.0
+) -> dict:
+    """
+    Recognize faces in a decoded frame and optionally mark attendance
+    
+    Args:
+        trainer: Face recognition trainer
+        frame: Image frame (BGR)
+        camera_id: Camera ID
+        mark_attendance: Whether to mark attendance
+        db: Database session
+        bbox_scale: Scale the frame was resized by; boxes are mapped back to
+            the original image's coordinates
+        
+    Returns:
+        Recognition response payload
+    """
+    # Recognize faces
+    results = trainer.recognize_face(frame)
+    
+    # Mark attendance if requested (best confidence per student, one INSERT)
+    attendance_records = []
+    if mark_attendance:
+        attendance_records = mark_students_present(
+            db, best_confidence_per_student(results), camera_id
+        )
+    
+    # Get student details for recognized faces in one query
+    recognized_ids = {r['student_id'] for r in results if r['student_id']}
+    students = {}
+    if recognized_ids:
+        students = {
+            student.id: student
+            for student in db.query(Student).filter(Student.id.in_(recognized_ids)).all()
+        }
+    
+    recognized_students = []
+    all_faces = []  # Include all detected faces for bounding boxes
+    
+    for result in results:
+        bbox = result['bbox']
+        if bbox_scale != 1.0:
+            bbox = [int(round(v / bbox_scale)) for v in bbox]
+        
+        face_data = {
+            'bbox': bbox,
+            'detection_score': result.get('detection_score', 0.0),
+            'student_id': result.get('student_id'),
+            'confidence': result.get('confidence', 0.0)
+        }
+        
+        if result['student_id']:
+            student = students.get(result['student_id'])
+            if student:
+                face_data.update({
+                    'roll_number': student.roll_number,
+                    'name': student.name,
+                    'recognized': True
+                })
+                recognized_students.append(face_data)
+        else:
+            face_data['recognized'] = False
+        
+        all_faces.append(face_data)
+    
+    return {
+        'success': True,
+        'recognized_count': len(recognized_students),
+        'students': recognized_students,
+        'all_faces': all_faces,  # Include all detected faces for drawing boxes
+        'attendance_marked': attendance_records
+    }
 
 
 @router.post("/recognize-frame")
@@ -25,7 +134,8 @@ async def recognize_frame(
     frame_base64: str = Form(...),
     camera_id: int = Form(None),
     mark_attendance: bool = Form(True),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    trainer: FaceRecognitionTrainer = Depends(get_trainer)
 ):
     """
     Recognize faces in a frame and optionally mark attendance
@@ -36,92 +146,12 @@ async def recognize_frame(
         mark_attendance: Whether to mark attendance
     """
     try:
-        print(f"Recognition request received, mark_attendance={mark_attendance}, camera_id={camera_id}")
-        
-        # Decode frame
-        frame = base64_to_frame(frame_base64)
-        print(f"Frame decoded: shape={frame.shape}, dtype={frame.dtype}")
-        
-        # Get trainer
-        trainer = get_trainer()
-        
-        # Recognize faces
-        results = trainer.recognize_face(frame)
-        print(f"Recognition results: {len(results)} faces detected")
-        for i, result in enumerate(results):
-            conf = result.get('confidence')
-            conf_str = f"{conf:.3f}" if conf is not None else "N/A"
-            print(f"Face {i}: student_id={result.get('student_id')}, confidence={conf_str}")
-        
-        # Mark attendance if requested
-        attendance_records = []
-        if mark_attendance:
-            today = date.today()
-            now = datetime.now()
-            
-            for result in results:
-                if result['student_id']:
-                    # Check if already marked today
-                    existing = db.query(Attendance).filter(
-                        Attendance.student_id == result['student_id'],
-                        Attendance.date == today
-                    ).first()
-                    
-                    if not existing:
-                        # Mark attendance
-                        attendance = Attendance(
-                            student_id=result['student_id'],
-                            date=today,
-                            time=now,
-                            camera_id=camera_id,
-                            confidence=result['confidence'],
-                            status='present'
-                        )
-                        db.add(attendance)
-                        db.commit()
-                        db.refresh(attendance)
-                        attendance_records.append(attendance.id)
-                        print(f"Attendance marked for student {result['student_id']}")
-        
-        # Get student details for recognized faces
-        recognized_students = []
-        all_faces = []  # Include all detected faces for bounding boxes
-        
-        for result in results:
-            face_data = {
-                'bbox': result['bbox'],
-                'detection_score': result.get('detection_score', 0.0),
-                'student_id': result.get('student_id'),
-                'confidence': result.get('confidence', 0.0)
-            }
-            
-            if result['student_id']:
-                student = db.query(Student).filter(Student.id == result['student_id']).first()
-                if student:
-                    face_data.update({
-                        'roll_number': student.roll_number,
-                        'name': student.name,
-                        'recognized': True
-                    })
-                    recognized_students.append(face_data)
-            else:
-                face_data['recognized'] = False
-            
-            all_faces.append(face_data)
-        
-        print(f"Returning {len(recognized_students)} recognized students, {len(all_faces)} total faces")
-        
-        return {
-            'success': True,
-            'recognized_count': len(recognized_students),
-            'students': recognized_students,
-            'all_faces': all_faces,  # Include all detected faces for drawing boxes
-            'attendance_marked': attendance_records
-        }
+        # Decoding, inference and DB writes are blocking; keep them off the event loop
+        frame = await run_in_threadpool(base64_to_frame, frame_base64)
+        return await run_in_threadpool(_recognize, trainer, frame, camera_id, mark_attendance, db)
     
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Recognition failed")
         raise HTTPException(status_code=500, detail=f"Recognition error: {str(e)}")
 
 
@@ -130,32 +160,38 @@ async def recognize_file(
     file: UploadFile = File(...),
     camera_id: int = Form(None),
     mark_attendance: bool = Form(True),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    trainer: FaceRecognitionTrainer = Depends(get_trainer)
 ):
     """
     Recognize faces in an uploaded image file
     """
     try:
-        # Read file
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Reject oversized uploads before buffering them (size may be unknown)
+        if file.size and file.size > _MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="File too large")
+        
+        contents = await file.read(_MAX_UPLOAD_BYTES + 1)
+        if len(contents) > _MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="File too large")
+        
+        # Decode straight into a frame (no base64 round trip), capped in size
+        frame, scale = await run_in_threadpool(_decode_upload, contents)
         
         if frame is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
         
-        # Convert frame to base64
-        frame_base64 = frame_to_base64(frame)
-        
-        # Use recognize_frame logic
-        return await recognize_frame(frame_base64, camera_id, mark_attendance, db)
+        return await run_in_threadpool(
+            _recognize, trainer, frame, camera_id, mark_attendance, db, scale
+        )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Recognition error: {str(e)}")
 
 
 @router.get("/stats")
-def get_recognition_stats():
+def get_recognition_stats(trainer: FaceRecognitionTrainer = Depends(get_trainer)):
     """Get recognition model statistics"""
-    trainer = get_trainer()
-    return trainer.get_model_stats()
+    return _stats_cache.get_or_set('model_stats', trainer.get_model_stats)
@@ -12,7 +12,9 @@ from app.models.student import Student
 from app.models.attendance import Attendance
 from app.schemas.student import StudentCreate, StudentUpdate, StudentResponse, StudentWithAttendance
 from app.schemas.attendance import AttendanceResponse
-from sqlalchemy import func
+from app.services.training_service import FaceRecognitionTrainer, get_trainer
+from app.services import frame_cache
+from sqlalchemy import func, select, case, or_
 
 router = APIRouter()
 
@@ -28,9 +30,9 @@ def get_students(
     query = db.query(Student)
     
     if is_active is not None:
-        query = query.filter(Student.is_active == is_active)
+        query = query.filter(Student.is_active.is_(is_active))
     
-    students = query.offset(skip).limit(limit).all()
+    students = query.order_by(Student.id).offset(skip).limit(limit).all()
     return students
 
 
@@ -50,39 +52,45 @@ def get_student_by_roll(roll_number: str, db: Session = Depends(get_db)):
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Calculate attendance stats
-    total_days = db.query(func.count(func.distinct(Attendance.date))).scalar() or 0
-    present_days = db.query(func.count(func.distinct(Attendance.date))).filter(
-        Attendance.student_id == student.id
-    ).scalar() or 0
+    # Calculate attendance stats (total and present days in a single scan)
+    row = db.execute(
+        select(
+            func.count(func.distinct(Attendance.date)).label("total_days"),
+            func.count(func.distinct(
+                case((Attendance.student_id == student.id, Attendance.date))
+            )).label("present_days")
+        )
+    ).one()
+    total_days = row.total_days or 0
+    present_days = row.present_days or 0
     
     attendance_percentage = (present_days / total_days * 100) if total_days > 0 else 0.0
     
-    student_dict = {
-        **student.__dict__,
-        'attendance_percentage': round(attendance_percentage, 2),
-        'total_days': total_days,
-        'present_days': present_days
-    }
-    
-    return student_dict
+    return StudentWithAttendance(
+        **StudentResponse.model_validate(student).model_dump(),
+        attendance_percentage=round(attendance_percentage, 2),
+        total_days=total_days,
+        present_days=present_days
+    )
 
 
 @router.post("/", response_model=StudentResponse)
 def create_student(student: StudentCreate, db: Session = Depends(get_db)):
     """Create new student"""
-    # Check if roll number already exists
-    existing = db.query(Student).filter(Student.roll_number == student.roll_number).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Roll number already exists")
-    
-    # Check if email already exists
+    # Check roll number and email uniqueness in one round trip
+    conditions = [Student.roll_number == student.roll_number]
     if student.email:
-        existing_email = db.query(Student).filter(Student.email == student.email).first()
-        if existing_email:
-            raise HTTPException(status_code=400, detail="Email already exists")
+        conditions.append(Student.email == student.email)
+    
+    conflicts = db.execute(
+        select(Student.roll_number, Student.email).where(or_(*conditions))
+    ).all()
+    if any(row.roll_number == student.roll_number for row in conflicts):
+        raise HTTPException(status_code=400, detail="Roll number already exists")
+    if conflicts:
+        raise HTTPException(status_code=400, detail="Email already exists")
     
-    db_student = Student(**student.dict())
+    db_student = Student(**student.model_dump())
     db.add(db_student)
     db.commit()
     db.refresh(db_student)
@@ -101,7 +109,7 @@ def update_student(
         raise HTTPException(status_code=404, detail="Student not found")
     
     # Update fields
-    update_data = student_update.dict(exclude_unset=True)
+    update_data = student_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(student, field, value)
     
@@ -111,16 +119,19 @@ def update_student(
 
 
 @router.delete("/{student_id}")
-def delete_student(student_id: int, db: Session = Depends(get_db)):
+def delete_student(
+    student_id: int,
+    db: Session = Depends(get_db),
+    trainer: FaceRecognitionTrainer = Depends(get_trainer)
+):
     """Delete student"""
     student = db.query(Student).filter(Student.id == student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
     # Delete from FAISS
-    from app.services.training_service import get_trainer
-    trainer = get_trainer()
     trainer.remove_student_data(student_id)
+    frame_cache.remove_frames(student_id)
     
     db.delete(student)
     db.commit()
@@ -132,9 +143,17 @@ def get_student_attendance(
     student_id: int,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 100,
+    before: Optional[datetime] = None,
     db: Session = Depends(get_db)
 ):
-    """Get student attendance records"""
+    """
+    Get student attendance records, newest first
+    
+    Pass the time of the last record received as `before` to fetch the next
+    page without the offset scan that deep `skip` values incur.
+    """
     student = db.query(Student).filter(Student.id == student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -145,6 +164,13 @@ def get_student_attendance(
         query = query.filter(Attendance.date >= start_date)
     if end_date:
         query = query.filter(Attendance.date <= end_date)
+    if before:
+        query = query.filter(Attendance.time < before)
     
-    attendance_records = query.order_by(Attendance.date.desc(), Attendance.time.desc()).all()
+    attendance_records = (
+        query.order_by(Attendance.date.desc(), Attendance.time.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
     return attendance_records
@@ -3,25 +3,144 @@ Training API routes
 """
 
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Body
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
-import numpy as np
-import cv2
+import asyncio
+import logging
+import functools
 import os
 import tempfile
 import shutil
 from datetime import datetime
-from PIL import Image
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 from app.core.database import get_db
 from app.models.student import Student
-from app.services.training_service import get_trainer
-from app.services.video_service import extract_frames_from_video, base64_to_frame
+from app.services.training_service import FaceRecognitionTrainer, get_trainer
+from app.services.video_service import extract_frames_from_video, base64_to_frames, bytes_to_frame
+from app.services import frame_cache
 from app.core.config import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Training (frame extraction, ONNX inference, FAISS updates) is CPU-heavy and
+# long-running; give it a bounded pool of its own so it neither blocks the event
+# loop nor exhausts the shared threadpool used by recognition and sync routes
+_training_executor = ThreadPoolExecutor(
+    max_workers=settings.TRAINING_WORKERS,
+    thread_name_prefix="training"
+)
+
+
+async def _run_training_job(func, *args, **kwargs):
+    """Run a blocking training step on the training pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_training_executor, functools.partial(func, *args, **kwargs))
+
+
+def _get_student(db: Session, student_id: int) -> Student:
+    """Load a student or raise 404 (blocking; call via run_in_threadpool from async routes)"""
+    student = db.query(Student).filter(Student.id == student_id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return student
+
+
+def _temp_dir() -> Optional[str]:
+    """Directory for transient uploads: settings.TEMP_DIR, else RAM-backed /dev/shm if usable"""
+    if settings.TEMP_DIR:
+        return settings.TEMP_DIR
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None  # system default
+
+
+def _save_upload(upload: UploadFile, path: str):
+    """
+    Write an uploaded file to disk, copying in-kernel with os.sendfile where supported
+    
+    Args:
+        upload: Uploaded file
+        path: Destination path
+    """
+    src = upload.file
+    src.seek(0)
+    
+    if hasattr(os, "sendfile"):
+        try:
+            src_fd = src.fileno()  # rolls a spooled upload over to a real file
+            size = os.fstat(src_fd).st_size
+            dst_fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            finally:
+                os.close(dst_fd)
+            return
+        except OSError:
+            src.seek(0)  # not a real file or sendfile unsupported; copy in userspace
+    
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(src, buffer)
+
+
+def _cache_frames(student_id: int, frames):
+    """Cache a student's decoded frames for retraining and expire stale entries"""
+    frame_cache.save_frames(student_id, frames)
+    removed = frame_cache.purge_expired()
+    if removed:
+        logger.info("Expired %d cached frame sets", removed)
+
+
+_PHOTO_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def _decode_and_save_photo(
+    contents: bytes,
+    index: int,
+    filename: Optional[str],
+    timestamp: str,
+    photos_dir: str
+) -> Optional[Tuple["np.ndarray", str]]:
+    """
+    Decode an uploaded photo and store the original bytes (no re-encode)
+    
+    Args:
+        contents: Uploaded file bytes
+        index: Photo index within the request
+        filename: Client-supplied file name (used for the extension)
+        timestamp: Timestamp shared by the request's photos
+        photos_dir: Student photos directory
+        
+    Returns:
+        Tuple of (image, saved path), or None if the photo could not be processed
+    """
+    try:
+        img = bytes_to_frame(contents)
+        if img is None:
+            logger.warning("Photo %d: could not decode image", index)
+            return None
+        
+        ext = os.path.splitext(filename or "")[1].lower()
+        if ext not in _PHOTO_EXTENSIONS:
+            ext = ".jpg"
+        photo_path = os.path.join(photos_dir, f"photo_{index}_{timestamp}{ext}")
+        with open(photo_path, "wb") as f:
+            f.write(contents)
+        
+        logger.debug("Photo %d: processed, shape=%s", index, img.shape)
+        return img, photo_path
+    
+    except Exception as e:
+        logger.warning("Photo %d: error processing: %s", index, e)
+        return None
 
 
 class TrainingFramesRequest(BaseModel):
@@ -34,7 +153,8 @@ async def train_student(
     student_id: int,
     video: UploadFile = File(...),
     num_frames: int = Form(50),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    trainer: FaceRecognitionTrainer = Depends(get_trainer)
 ):
     """
     Train face recognition model for a student using uploaded video
@@ -45,27 +165,23 @@ async def train_student(
         num_frames: Number of frames to extract
     """
     # Check if student exists
-    student = db.query(Student).filter(Student.id == student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
+    student = await run_in_threadpool(_get_student, db, student_id)
     
     try:
-        # Save video temporarily
-        temp_dir = tempfile.mkdtemp()
+        # Save video temporarily (RAM-backed when /dev/shm is available)
+        temp_dir = tempfile.mkdtemp(dir=_temp_dir())
         video_path = os.path.join(temp_dir, f"temp_video_{student_id}.mp4")
         
-        with open(video_path, "wb") as buffer:
-            shutil.copyfileobj(video.file, buffer)
+        await run_in_threadpool(_save_upload, video, video_path)
         
         # Extract frames
-        frames = extract_frames_from_video(video_path, num_frames=num_frames)
+        frames = await _run_training_job(extract_frames_from_video, video_path, num_frames=num_frames)
         
         if len(frames) == 0:
             raise HTTPException(status_code=400, detail="No frames could be extracted from video")
         
         # Train model
-        trainer = get_trainer()
-        result = trainer.process_student_frames(frames, student_id)
+        result = await _run_training_job(trainer.process_student_frames, frames, student_id)
         
         # Clean up
         shutil.rmtree(temp_dir)
@@ -73,7 +189,8 @@ async def train_student(
         if result['success']:
             # Update student record
             student.face_encoding_id = student_id
-            db.commit()
+            await run_in_threadpool(db.commit)
+            await _run_training_job(_cache_frames, student_id, frames)
             
             return {
                 'success': True,
@@ -100,7 +217,8 @@ async def train_student(
 async def train_student_frames(
     student_id: int,
     request: TrainingFramesRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    trainer: FaceRecognitionTrainer = Depends(get_trainer)
 ):
     """
     Train face recognition model for a student using base64 encoded frames
@@ -110,39 +228,31 @@ async def train_student_frames(
         request: Training frames request with base64 encoded frames
     """
     # Check if student exists
-    student = db.query(Student).filter(Student.id == student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
+    student = await run_in_threadpool(_get_student, db, student_id)
     
     try:
-        # Decode frames
-        frames = []
-        for i, frame_str in enumerate(request.frames_base64):
-            try:
-                frame = base64_to_frame(frame_str)
-                frames.append(frame)
-            except Exception as decode_error:
-                print(f"Error decoding frame {i}: {str(decode_error)}")
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Failed to decode frame {i}: {str(decode_error)}"
-                )
+        # Decode frames in parallel, off the event loop
+        try:
+            frames = await run_in_threadpool(base64_to_frames, request.frames_base64)
+        except ValueError as decode_error:
+            logger.warning("%s", decode_error)
+            raise HTTPException(status_code=400, detail=str(decode_error))
         
         if len(frames) == 0:
             raise HTTPException(status_code=400, detail="No frames provided")
         
-        print(f"Training student {student_id} with {len(frames)} frames...")
+        logger.info("Training student %d with %d frames", student_id, len(frames))
         
         # Train model
-        trainer = get_trainer()
-        result = trainer.process_student_frames(frames, student_id)
+        result = await _run_training_job(trainer.process_student_frames, frames, student_id)
         
-        print(f"Training result: {result}")
+        logger.info("Training result for student %d: %s", student_id, result)
         
         if result['success']:
             # Update student record
             student.face_encoding_id = student_id
-            db.commit()
+            await run_in_threadpool(db.commit)
+            await _run_training_job(_cache_frames, student_id, frames)
             
             return {
                 'success': True,
@@ -161,8 +271,7 @@ async def train_student_frames(
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Training failed for student %d", student_id)
         raise HTTPException(status_code=500, detail=f"Training error: {str(e)}")
 
 
@@ -170,7 +279,8 @@ async def train_student_frames(
 async def train_student_photos(
     student_id: int,
     photos: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    trainer: FaceRecognitionTrainer = Depends(get_trainer)
 ):
     """
     Train face recognition model for a student using uploaded photos
@@ -180,67 +290,55 @@ async def train_student_photos(
         photos: List of photo files
     """
     # Check if student exists
-    student = db.query(Student).filter(Student.id == student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
+    student = await run_in_threadpool(_get_student, db, student_id)
     
     if not photos or len(photos) == 0:
         raise HTTPException(status_code=400, detail="No photos provided")
     
     try:
-        print(f"Training student {student_id} with {len(photos)} photos...")
+        logger.info("Training student %d with %d photos", student_id, len(photos))
         
         # Create student photos directory
         student_photos_dir = os.path.join(settings.UPLOADS_PATH, f"student_{student_id}")
         os.makedirs(student_photos_dir, exist_ok=True)
         
-        # Process each photo
+        # Read all uploads, then decode and save them concurrently off the event loop
+        contents_list = await asyncio.gather(*[photo.read() for photo in photos])
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        processed = await asyncio.gather(*[
+            run_in_threadpool(
+                _decode_and_save_photo, contents, i, photo.filename, timestamp, student_photos_dir
+            )
+            for i, (photo, contents) in enumerate(zip(photos, contents_list))
+        ])
+        
         frames = []
         saved_photo_paths = []
-        
-        for i, photo in enumerate(photos):
-            try:
-                # Read photo
-                contents = await photo.read()
-                nparr = np.frombuffer(contents, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if img is None:
-                    print(f"Photo {i}: Could not decode image")
-                    continue
-                
-                # Save original photo
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                photo_filename = f"photo_{i}_{timestamp}.jpg"
-                photo_path = os.path.join(student_photos_dir, photo_filename)
-                cv2.imwrite(photo_path, img)
-                saved_photo_paths.append(photo_path)
-                
-                # Add to frames for training
+        for item in processed:
+            if item is not None:
+                img, photo_path = item
                 frames.append(img)
-                print(f"Photo {i}: Processed successfully, shape={img.shape}")
-                
-            except Exception as e:
-                print(f"Photo {i}: Error processing: {e}")
-                continue
+                saved_photo_paths.append(photo_path)
         
         if len(frames) == 0:
             raise HTTPException(status_code=400, detail="No valid photos could be processed")
         
-        print(f"Successfully processed {len(frames)} photos, starting training...")
+        logger.info("Processed %d photos, starting training", len(frames))
         
         # Train model
-        trainer = get_trainer()
-        result = trainer.process_student_frames(frames, student_id, min_faces=5)  # Lower threshold for photos
+        result = await _run_training_job(
+            trainer.process_student_frames, frames, student_id, min_faces=5  # Lower threshold for photos
+        )
         
-        print(f"Training result: {result}")
+        logger.info("Training result for student %d: %s", student_id, result)
         
         if result['success']:
             # Update student record with first photo path
             if saved_photo_paths:
                 student.photo_path = saved_photo_paths[0]
             student.face_encoding_id = student_id
-            db.commit()
+            await run_in_threadpool(db.commit)
+            await _run_training_job(_cache_frames, student_id, frames)
             
             return {
                 'success': True,
@@ -267,20 +365,22 @@ async def train_student_photos(
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Training failed for student %d", student_id)
         raise HTTPException(status_code=500, detail=f"Training error: {str(e)}")
 
 
 @router.delete("/remove-student/{student_id}")
-def remove_student_training(student_id: int, db: Session = Depends(get_db)):
+def remove_student_training(
+    student_id: int,
+    db: Session = Depends(get_db),
+    trainer: FaceRecognitionTrainer = Depends(get_trainer)
+):
     """Remove student training data from model"""
     student = db.query(Student).filter(Student.id == student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
     try:
-        trainer = get_trainer()
         trainer.remove_student_data(student_id)
         
         # Update student record
@@ -297,24 +397,79 @@ def remove_student_training(student_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/retrain-all")
-async def retrain_all_students(db: Session = Depends(get_db)):
-    """Retrain model with all students (requires video files for each student)"""
-    # This is a placeholder - implement based on your storage strategy
-    raise HTTPException(status_code=501, detail="Retrain all not implemented yet")
+async def retrain_all_students(
+    db: Session = Depends(get_db),
+    trainer: FaceRecognitionTrainer = Depends(get_trainer)
+):
+    """
+    Retrain all active students from their cached training frames
+    
+    Students without cached frames (cache expired or never trained on this
+    host) keep their current embeddings and are reported as skipped.
+    """
+    cached_ids = set(await run_in_threadpool(frame_cache.cached_student_ids))
+    students = await run_in_threadpool(
+        lambda: db.query(Student).filter(Student.is_active.is_(True)).order_by(Student.id).all()
+    )
+    
+    results = []
+    skipped = []
+    for student in students:
+        if student.id not in cached_ids:
+            skipped.append(student.id)
+            continue
+        
+        frames = await run_in_threadpool(frame_cache.load_frames, student.id)
+        if frames is None:
+            skipped.append(student.id)
+            continue
+        
+        # Retrain with the threshold the student was trained with (photo
+        # uploads used 5, which is also assumed for older enrollments)
+        metadata = trainer.faiss_db.student_metadata.get(student.id, {})
+        min_faces = metadata.get('min_faces', 5)
+        
+        try:
+            # New embeddings are computed before the old ones are swapped out,
+            # so a failed retrain keeps the student's working embeddings
+            result = await _run_training_job(
+                trainer.process_student_frames, frames, student.id, min_faces=min_faces, replace=True
+            )
+        except Exception as e:
+            logger.exception("Retraining failed for student %d", student.id)
+            result = {'success': False, 'message': str(e), 'embeddings_count': 0}
+        
+        if result['success']:
+            student.face_encoding_id = student.id
+        
+        results.append({
+            'student_id': student.id,
+            'student_name': student.name,
+            'success': result['success'],
+            'message': result['message'],
+            'embeddings_count': result.get('embeddings_count', 0)
+        })
+    
+    await run_in_threadpool(db.commit)
+    
+    return {
+        'success': all(r['success'] for r in results),
+        'retrained': sum(1 for r in results if r['success']),
+        'skipped_student_ids': skipped,
+        'results': results
+    }
 
 
 @router.get("/model-stats")
-def get_model_stats():
+def get_model_stats(trainer: FaceRecognitionTrainer = Depends(get_trainer)):
     """Get model statistics"""
-    trainer = get_trainer()
     return trainer.get_model_stats()
 
 
 @router.post("/export-model")
-def export_model():
+def export_model(trainer: FaceRecognitionTrainer = Depends(get_trainer)):
     """Export model as pickle file"""
     try:
-        trainer = get_trainer()
         output_path = trainer.export_model_pickle()
         return {
             'success': True,
@@ -326,10 +481,9 @@ def export_model():
 
 
 @router.post("/save-model")
-def save_model():
+def save_model(trainer: FaceRecognitionTrainer = Depends(get_trainer)):
     """Save current model to disk"""
     try:
-        trainer = get_trainer()
         trainer.save_model()
         return {
             'success': True,
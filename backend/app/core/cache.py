@@ -0,0 +1,65 @@
+"""
+In-process TTL cache for read-heavy, low-volatility endpoints
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class TTLCache:
+    """
+    Thread-safe key/value cache whose entries expire after a fixed time-to-live
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 128):
+        """
+        Initialize cache
+
+        Args:
+            ttl: Seconds an entry stays valid (0 disables caching)
+            maxsize: Maximum number of entries kept
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, computing it with factory on a miss
+
+        Args:
+            key: Cache key
+            factory: Zero-argument callable producing the value
+
+        Returns:
+            Cached or freshly computed value
+        """
+        if self.ttl <= 0:
+            return factory()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        # Compute outside the lock so slow factories don't serialize other keys
+        value = factory()
+
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                # Drop expired entries first, then the oldest one if still full
+                self._entries = {k: e for k, e in self._entries.items() if e[0] > now}
+                if len(self._entries) >= self.maxsize:
+                    oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                    del self._entries[oldest]
+            self._entries[key] = (now + self.ttl, value)
+
+        return value
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
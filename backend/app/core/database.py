@@ -11,11 +11,21 @@ from app.core.config import settings
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    echo=False
+    echo=False,
+    # Enough connections for the sync route threads and camera workers to
+    # reuse one instead of paying a new handshake per session
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    # Collapse executemany() into multi-row INSERT ... VALUES statements
+    executemany_mode="values_plus_batch",
+    insertmanyvalues_page_size=1000
 )
 
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: reading attributes after commit must not trigger a
+# reload SELECT (routes refresh explicitly where server-side values matter)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Base class for models
 Base = declarative_base()
@@ -0,0 +1,47 @@
+"""
+Logging configuration
+Log records are handed to a queue on the calling thread and written to stdout
+by a background listener, so request and worker threads never block on I/O.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+from app.core.config import settings
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_pid: Optional[int] = None
+
+
+def setup_logging():
+    """
+    Route the root logger through a QueueHandler (idempotent per process)
+
+    The listener thread does not survive fork, so a forked child (e.g. a
+    gunicorn worker with preload_app) that calls this again gets its own
+    queue and listener instead of filling the parent's undrained queue.
+    """
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(
+        "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+    ))
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(settings.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    _listener_pid = os.getpid()
+    atexit.register(_listener.stop)
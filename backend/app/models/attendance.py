@@ -2,7 +2,7 @@
 Attendance database model
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Date, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -10,11 +10,16 @@ from app.core.database import Base
 
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        # One record per student per day; also serves per-student history lookups
+        Index("ix_attendance_student_date", "student_id", "date", unique=True),
+        Index("ix_attendance_camera_id", "camera_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
-    date = Column(Date, nullable=False, index=True)
-    time = Column(DateTime(timezone=True), nullable=False)
+    date = Column(Date, nullable=False, index=True, server_default=func.current_date())
+    time = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     camera_id = Column(Integer, ForeignKey("cameras.id"), nullable=True)
     confidence = Column(Float)  # Recognition confidence score
     status = Column(String, default="present")  # present, absent, late
@@ -24,5 +29,18 @@ class Attendance(Base):
     student = relationship("Student", back_populates="attendance_records")
     camera = relationship("Camera", back_populates="attendance_records")
     
+    # Flattened relationship fields read by AttendanceWithStudent (from_attributes)
+    @property
+    def student_name(self):
+        return self.student.name
+    
+    @property
+    def student_roll_number(self):
+        return self.student.roll_number
+    
+    @property
+    def camera_name(self):
+        return self.camera.name if self.camera else None
+    
     def __repr__(self):
         return f"<Attendance {self.student_id} on {self.date} at {self.time}>"
@@ -2,7 +2,7 @@
 Student database model
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, LargeBinary
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, LargeBinary, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -10,6 +10,10 @@ from app.core.database import Base
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (
+        # Partial index so active-student counts and listings scan only active rows
+        Index("ix_student_active", "id", postgresql_where=text("is_active")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     roll_number = Column(String, unique=True, index=True, nullable=False)
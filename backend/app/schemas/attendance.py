@@ -2,7 +2,7 @@
 Pydantic schemas for Attendance
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 from datetime import datetime, date
 
@@ -24,8 +24,7 @@ class AttendanceResponse(AttendanceBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AttendanceWithStudent(AttendanceResponse):
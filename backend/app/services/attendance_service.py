@@ -0,0 +1,75 @@
+"""
+Attendance marking service shared by the recognition API and background camera workers
+"""
+
+from typing import Dict, List, Optional
+from datetime import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.attendance import Attendance
+
+
+def best_confidence_per_student(results: List[Dict]) -> Dict[int, float]:
+    """
+    Collapse recognition results to the best confidence per recognized student
+
+    Args:
+        results: Recognition results from FaceRecognitionTrainer.recognize_face
+
+    Returns:
+        Dictionary of student_id -> best confidence
+    """
+    recognized = {}
+    for result in results:
+        sid = result.get('student_id')
+        confidence = result.get('confidence', 0.0)
+        if sid and (sid not in recognized or confidence > recognized[sid]):
+            recognized[sid] = confidence
+    return recognized
+
+
+def mark_students_present(
+    db: Session,
+    recognized: Dict[int, float],
+    camera_id: Optional[int],
+    now: Optional[datetime] = None
+) -> List[int]:
+    """
+    Mark students present for today in a single round trip
+
+    Students already marked today hit the (student_id, date) unique index and
+    are skipped by the database (INSERT ... ON CONFLICT DO NOTHING).
+
+    Args:
+        db: Database session (committed on success)
+        recognized: Dictionary of student_id -> confidence
+        camera_id: Camera ID
+        now: Timestamp for the records (defaults to now)
+
+    Returns:
+        IDs of the newly created attendance records
+    """
+    if not recognized:
+        return []
+
+    now = now or datetime.now()
+    stmt = (
+        pg_insert(Attendance)
+        .values([
+            {
+                'student_id': sid,
+                'date': now.date(),
+                'time': now,
+                'camera_id': camera_id,
+                'confidence': confidence,
+                'status': 'present'
+            }
+            for sid, confidence in recognized.items()
+        ])
+        .on_conflict_do_nothing(index_elements=[Attendance.student_id, Attendance.date])
+        .returning(Attendance.id)
+    )
+    attendance_ids = list(db.scalars(stmt))
+    db.commit()
+    return attendance_ids
@@ -5,15 +5,97 @@ Background camera runner to process camera streams and mark attendance.
 import threading
 import time
 from typing import Dict, Optional
-import cv2
+import numpy as np
 
 from app.services.video_service import VideoCapture
 from app.services.training_service import get_trainer
+from app.services.face_detection import DetectionCache
 from app.core.database import SessionLocal
-from app.models.attendance import Attendance
-from app.models.student import Student
+from app.services.attendance_service import best_confidence_per_student, mark_students_present
 from app.models.camera import Camera
-from datetime import date, datetime
+from datetime import datetime
+
+
+class FrameGrabber:
+    """
+    Keeps one capture open and grabs frames continuously on its own thread
+
+    Grabbing drains the driver/network buffer so the next frame handed out is
+    current, while the (more expensive) decode only happens in read(). The
+    capture is reopened after repeated grab failures.
+    """
+
+    def __init__(self, source: str, max_failures: int = 30):
+        self.source = source
+        self.max_failures = max_failures
+        self.error: Optional[str] = None
+        self._cap: Optional[VideoCapture] = None
+        self._cap_lock = threading.Lock()
+        self._has_frame = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self._close()
+
+    def read(self) -> Optional[np.ndarray]:
+        """Decode and return the most recently grabbed frame, or None if unavailable"""
+        with self._cap_lock:
+            if self._cap is None or not self._has_frame:
+                return None
+            return self._cap.retrieve()
+
+    def _open(self) -> bool:
+        cap = VideoCapture(self.source)
+        if not cap.open():
+            cap.close()
+            self.error = f"Unable to open source: {self.source}"
+            return False
+        with self._cap_lock:
+            self._cap = cap
+            self._has_frame = False
+        self.error = None
+        return True
+
+    def _close(self):
+        with self._cap_lock:
+            cap, self._cap = self._cap, None
+            self._has_frame = False
+        if cap is not None:
+            cap.close()
+
+    def _run(self):
+        failures = 0
+        while not self._stop_event.is_set():
+            if self._cap is None and not self._open():
+                self._stop_event.wait(timeout=2)
+                continue
+
+            with self._cap_lock:
+                ok = self._cap is not None and self._cap.grab()
+                if ok:
+                    self._has_frame = True
+
+            if ok:
+                failures = 0
+                # Yield so read() can take the lock between grabs
+                time.sleep(0.001)
+                continue
+
+            failures += 1
+            if failures >= self.max_failures:
+                self.error = "Lost connection, reconnecting"
+                self._close()
+                failures = 0
+            self._stop_event.wait(timeout=0.05)
 
 
 class CameraWorker:
@@ -26,6 +108,28 @@ class CameraWorker:
         self.running = False
         self.last_result = None
         self.error: Optional[str] = None
+        # Most recent decoded frame, shared with snapshot/stream endpoints
+        self._frame_lock = threading.Lock()
+        self._latest_frame: Optional[np.ndarray] = None
+        self._latest_frame_time = 0.0
+
+    def latest_frame(self, max_age: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Get the most recent frame read by this worker
+
+        Args:
+            max_age: Ignore the frame if it is older than this many seconds
+
+        Returns:
+            Frame (must be treated as read-only) or None if unavailable
+        """
+        with self._frame_lock:
+            frame, frame_time = self._latest_frame, self._latest_frame_time
+        if frame is None:
+            return None
+        if max_age is not None and time.time() - frame_time > max_age:
+            return None
+        return frame
 
     def start(self):
         if self.running:
@@ -44,57 +148,52 @@ class CameraWorker:
     def _run(self):
         trainer = get_trainer()
         interval = 1.0 / self.fps if self.fps > 0 else 1.0
+        # One session for the worker's lifetime (this thread only) instead of one per poll
+        db = SessionLocal()
+        # One long-lived capture instead of a reconnect (RTSP handshake) per poll
+        grabber = FrameGrabber(self.source)
+        grabber.start()
+        try:
+            self._loop(trainer, db, grabber, interval)
+        finally:
+            grabber.stop()
+            db.close()
 
+    def _loop(self, trainer, db, grabber: FrameGrabber, interval: float):
+        # Fixed cameras see mostly static scenes; reuse detections between near-identical frames
+        detection_cache = DetectionCache(trainer.detector)
         while not self.stop_event.is_set():
             start_t = time.time()
             try:
-                # Open and read one frame per cycle to avoid long-lived connections for fragile IP cams
-                with VideoCapture(self.source) as cap:
-                    if not cap.is_opened:
-                        self.error = f"Unable to open source: {self.source}"
-                        time.sleep(2)
-                        continue
-                    frame = cap.read()
-                    if frame is None:
-                        self.error = "Failed to read frame"
-                        time.sleep(1)
-                        continue
+                frame = grabber.read()
+                if frame is None:
+                    self.error = grabber.error or "Waiting for first frame"
+                    self.stop_event.wait(timeout=0.5)
+                    continue
+
+                with self._frame_lock:
+                    self._latest_frame = frame
+                    self._latest_frame_time = time.time()
 
                 # Recognize
-                results = trainer.recognize_face(frame)
+                results = trainer.recognize_face(frame, detection_cache)
 
-                # Mark attendance for recognized faces
-                today = date.today()
+                # Mark attendance for recognized faces (one INSERT ... ON CONFLICT)
                 now = datetime.now()
-                db = SessionLocal()
+                recognized = best_confidence_per_student(results)
                 try:
-                    for result in results:
-                        sid = result.get('student_id')
-                        if sid:
-                            existing = db.query(Attendance).filter(
-                                Attendance.student_id == sid,
-                                Attendance.date == today
-                            ).first()
-                            if not existing:
-                                attendance = Attendance(
-                                    student_id=sid,
-                                    date=today,
-                                    time=now,
-                                    camera_id=self.camera_id,
-                                    confidence=result.get('confidence', 0.0),
-                                    status='present'
-                                )
-                                db.add(attendance)
-                                db.commit()
-                    # keep a lightweight summary
-                    self.last_result = {
-                        'timestamp': now.isoformat(),
-                        'recognized': [r.get('student_id') for r in results if r.get('student_id')],
-                        'count': len([r for r in results if r.get('student_id')])
-                    }
-                    self.error = None
-                finally:
-                    db.close()
+                    mark_students_present(db, recognized, self.camera_id, now)
+                except Exception:
+                    db.rollback()  # keep the long-lived session usable
+                    raise
+
+                # keep a lightweight summary
+                self.last_result = {
+                    'timestamp': now.isoformat(),
+                    'recognized': [r.get('student_id') for r in results if r.get('student_id')],
+                    'count': len([r for r in results if r.get('student_id')])
+                }
+                self.error = None
 
             except Exception as e:
                 self.error = str(e)
@@ -122,35 +221,49 @@ class BackgroundCameraManager:
             return worker
 
     def stop(self, camera_id: int):
-        with self.lock:
-            worker = self.workers.get(camera_id)
-            if worker:
-                worker.stop()
-                return True
-            return False
+        worker = self.workers.get(camera_id)
+        if worker:
+            # Joining can take seconds; don't hold the manager lock meanwhile
+            worker.stop()
+            return True
+        return False
 
     def stop_all(self):
         with self.lock:
-            for worker in list(self.workers.values()):
-                worker.stop()
-            return True
+            workers = list(self.workers.values())
+        for worker in workers:
+            worker.stop()
+        return True
+
+    @staticmethod
+    def _worker_status(camera_id: int, worker: Optional[CameraWorker]) -> dict:
+        # Single-reference reads are atomic; no lock needed for a status snapshot
+        if not worker:
+            return {'running': False}
+        return {
+            'running': worker.running,
+            'error': worker.error,
+            'last_result': worker.last_result,
+            'fps': worker.fps,
+            'camera_id': camera_id
+        }
 
     def status(self, camera_id: int):
-        with self.lock:
-            worker = self.workers.get(camera_id)
-            if not worker:
-                return {'running': False}
-            return {
-                'running': worker.running,
-                'error': worker.error,
-                'last_result': worker.last_result,
-                'fps': worker.fps,
-                'camera_id': camera_id
-            }
+        return self._worker_status(camera_id, self.workers.get(camera_id))
+
+    def latest_frame(self, camera_id: int) -> Optional[np.ndarray]:
+        """Latest frame from a running worker, or None if no fresh frame is available"""
+        worker = self.workers.get(camera_id)
+        if not worker or not worker.running:
+            return None
+        # Accept frames up to two polling intervals old
+        return worker.latest_frame(max_age=2.0 / worker.fps)
 
     def all_status(self):
+        # Snapshot under the lock (dict mutation guard only), build statuses outside it
         with self.lock:
-            return {cid: self.status(cid) for cid in self.workers.keys()}
+            workers = list(self.workers.items())
+        return {cid: self._worker_status(cid, worker) for cid, worker in workers}
 
 
 _manager = BackgroundCameraManager()
@@ -3,12 +3,22 @@ ArcFace Face Recognition Service using ONNX Runtime
 """
 
 import cv2
+import faiss
 import numpy as np
-import onnxruntime as ort
-from typing import Optional
+from typing import List, Optional
 from app.core.config import settings
+from app.services.onnx_session import create_session
 import os
 
+# Canonical ArcFace landmark positions in a 112x112 crop
+_ARCFACE_TEMPLATE = np.array([
+    [38.2946, 51.6963],
+    [73.5318, 51.5014],
+    [56.0252, 71.7366],
+    [41.5493, 92.3655],
+    [70.7299, 92.2041],
+], dtype=np.float32)
+
 
 class ArcFaceRecognizer:
     """
@@ -26,31 +36,9 @@ class ArcFaceRecognizer:
                 f"https://github.com/deepinsight/insightface/tree/master/model_zoo"
             )
         
-        # Initialize ONNX Runtime session with GPU acceleration
-        # Try CUDA first, fallback to CPU if not available
-        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
-        
-        # Try to create session with GPU, fallback to CPU if fails
-        try:
-            self.session = ort.InferenceSession(
-                self.model_path,
-                providers=providers
-            )
-        except Exception as e:
-            print(f"⚠️ Failed to initialize with CUDA: {e}")
-            print("⚠️ Falling back to CPU execution")
-            self.session = ort.InferenceSession(
-                self.model_path,
-                providers=['CPUExecutionProvider']
-            )
-        
-        # Log which provider is being used
-        available_providers = self.session.get_providers()
-        print(f"ONNX Runtime providers available: {available_providers}")
-        if 'CUDAExecutionProvider' in available_providers:
-            print("✅ GPU acceleration ENABLED (CUDA)")
-        else:
-            print("⚠️  Running on CPU (CUDA not available)")
+        # Initialize ONNX Runtime session (CUDA first, CPU fallback); symbolic
+        # spatial dimensions are pinned to 112x112, the batch stays dynamic
+        self.session = create_session(self.model_path, input_shape=(None, 3, 112, 112))
         
         # Get input details
         self.input_name = self.session.get_inputs()[0].name
@@ -65,11 +53,39 @@ class ArcFaceRecognizer:
             self.input_height = 112
             self.input_width = 112
         
+        # Alignment template scaled to the model input, computed once
+        self.dst_landmarks = _ARCFACE_TEMPLATE * np.array(
+            [self.input_width / 112.0, self.input_height / 112.0], dtype=np.float32
+        )
+        
+        # FP16 exports that don't keep float32 I/O expect half-precision input
+        self.input_dtype = np.float16 if self.session.get_inputs()[0].type == 'tensor(float16)' else np.float32
+        
+        # A symbolic batch dimension means several faces can share one inference call
+        self.supports_batch = not isinstance(self.input_shape[0], int)
+        
         # Get output details
         self.output_name = self.session.get_outputs()[0].name
         
+        # Bound once so per-face calls skip attribute lookups
+        self._run = self.session.run
+        self._output_names = [self.output_name]
+        
+        if settings.ONNX_WARMUP:
+            self.warmup()
+        
         print(f"ArcFace Recognizer initialized with input size: {self.input_width}x{self.input_height}")
     
+    def warmup(self):
+        """
+        Run the model once on a blank single-face batch
+        
+        Moves cuDNN algorithm selection and memory arena growth out of the
+        first recognition (other batch sizes are tuned when first seen).
+        """
+        blob = np.zeros((1, 3, self.input_height, self.input_width), dtype=self.input_dtype)
+        self._run(self._output_names, {self.input_name: blob})
+    
     def preprocess(self, face_img: np.ndarray) -> np.ndarray:
         """
         Preprocess face image for ArcFace model
@@ -78,23 +94,35 @@ class ArcFaceRecognizer:
             face_img: Cropped face image (BGR)
             
         Returns:
-            Preprocessed image tensor
+            Preprocessed CHW float32 tensor (no batch dimension)
         """
-        # Resize to model input size
-        resized = cv2.resize(face_img, (self.input_width, self.input_height))
-        
-        # Convert BGR to RGB
-        rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-        
-        # Normalize
-        normalized = rgb.astype(np.float32)
-        normalized = (normalized - 127.5) / 128.0
-        
-        # Transpose to NCHW format
-        transposed = np.transpose(normalized, (2, 0, 1))
-        blob = np.expand_dims(transposed, axis=0)
+        # Resize, BGR->RGB, normalize and transpose in one pass
+        blob = cv2.dnn.blobFromImage(
+            face_img,
+            scalefactor=1.0 / 128.0,
+            size=(self.input_width, self.input_height),
+            mean=(127.5, 127.5, 127.5),
+            swapRB=True,
+            crop=False
+        )
+        return blob[0]
+    
+    def preprocess_batch(self, face_imgs: List[np.ndarray]) -> np.ndarray:
+        """
+        Preprocess several face images into one contiguous NCHW tensor
         
-        return blob
+        Args:
+            face_imgs: Cropped face images (BGR, any size)
+            
+        Returns:
+            (N, 3, H, W) tensor in the model's input dtype
+        """
+        batch = np.empty(
+            (len(face_imgs), 3, self.input_height, self.input_width), dtype=self.input_dtype
+        )
+        for i, face_img in enumerate(face_imgs):
+            batch[i] = self.preprocess(face_img)
+        return batch
     
     def get_embedding(self, face_img: np.ndarray) -> np.ndarray:
         """
@@ -104,20 +132,56 @@ class ArcFaceRecognizer:
             face_img: Cropped face image (BGR)
             
         Returns:
-            512-dimensional embedding vector
+            512-dimensional L2-normalized float32 embedding vector
         """
         # Preprocess
-        blob = self.preprocess(face_img)
+        blob = self.preprocess_batch([face_img])
         
         # Run inference
-        embedding = self.session.run([self.output_name], {self.input_name: blob})[0]
+        embedding = self._run(self._output_names, {self.input_name: blob})[0]
         
-        # Normalize embedding
-        embedding = embedding.flatten()
-        embedding = embedding / np.linalg.norm(embedding)
+        # Normalize embedding (C-contiguous float32, as FaissVectorDB expects)
+        embedding = np.ascontiguousarray(embedding.reshape(-1), dtype=np.float32)
+        faiss.normalize_L2(embedding.reshape(1, -1))  # in place, through a (1, 512) view
         
         return embedding
     
+    def get_embeddings(self, face_imgs: List[np.ndarray], batch_size: int = None) -> np.ndarray:
+        """
+        Get embeddings for several face images using batched inference
+        
+        Args:
+            face_imgs: Cropped face images (BGR, any size)
+            batch_size: Faces per inference call (default TRAINING_BATCH_SIZE)
+            
+        Returns:
+            C-contiguous (N, 512) float32 array of L2-normalized embeddings
+        """
+        if len(face_imgs) == 0:
+            return np.empty((0, settings.FAISS_DIMENSION), dtype=np.float32)
+        
+        if not self.supports_batch:
+            return np.stack([self.get_embedding(face_img) for face_img in face_imgs])
+        
+        batch_size = batch_size or settings.TRAINING_BATCH_SIZE
+        
+        # Preprocess into one contiguous NCHW tensor
+        blobs = self.preprocess_batch(face_imgs)
+        
+        # Run inference in minibatches
+        outputs = [
+            self._run(self._output_names, {self.input_name: blobs[start:start + batch_size]})[0]
+            for start in range(0, len(blobs), batch_size)
+        ]
+        embeddings = np.ascontiguousarray(
+            np.concatenate(outputs).reshape(len(face_imgs), -1), dtype=np.float32
+        )
+        
+        # Normalize embeddings in place (one fused pass, no temporaries)
+        faiss.normalize_L2(embeddings)
+        
+        return embeddings
+    
     def extract_face_from_bbox(self, image: np.ndarray, bbox: list, margin: float = 0.2) -> Optional[np.ndarray]:
         """
         Extract face region from image using bounding box
@@ -166,26 +230,45 @@ class ArcFaceRecognizer:
         similarity = np.dot(embedding1, embedding2)
         return float(similarity)
     
-    def align_face(self, image: np.ndarray, landmarks: list = None) -> np.ndarray:
+    def align_face(self, image: np.ndarray, landmarks: np.ndarray = None) -> np.ndarray:
         """
         Align face using facial landmarks (if available)
         
+        Estimates a similarity transform (rotation, uniform scale, translation)
+        from the five landmarks to the ArcFace template and warps straight to
+        the model input size, so preprocessing needs no further resize.
+        
         Args:
-            image: Face image
-            landmarks: Facial landmarks (5 points: left_eye, right_eye, nose, left_mouth, right_mouth)
+            image: Image the landmarks refer to (full frame or face crop)
+            landmarks: (5, 2) facial landmarks (left_eye, right_eye, nose, left_mouth, right_mouth)
             
         Returns:
-            Aligned face image
+            Aligned face image, or the original image if alignment is not possible
         """
-        # Simple alignment - just return original if no landmarks
-        # For production, implement proper alignment using landmarks
         if landmarks is None or len(landmarks) < 5:
             return image
         
-        # TODO: Implement proper face alignment
-        # This would involve calculating rotation and scaling based on eye positions
+        src = np.asarray(landmarks, dtype=np.float32).reshape(-1, 2)[:5]  # no copy for detector output
+        matrix, _ = cv2.estimateAffinePartial2D(src, self.dst_landmarks, method=cv2.LMEDS)
+        if matrix is None:
+            return image
+        
+        return cv2.warpAffine(image, matrix, (self.input_width, self.input_height), borderValue=0)
+    
+    def extract_face(self, frame: np.ndarray, face: dict) -> Optional[np.ndarray]:
+        """
+        Extract a detected face for embedding, aligned when FACE_ALIGNMENT is on
         
-        return image
+        Args:
+            frame: Full frame
+            face: Detection with 'bbox' and optional 'landmarks' (frame coordinates)
+            
+        Returns:
+            Face image or None if invalid
+        """
+        if settings.FACE_ALIGNMENT and face.get('landmarks') is not None:
+            return self.align_face(frame, face['landmarks'])
+        return self.extract_face_from_bbox(frame, face['bbox'])
 
 
 # Global recognizer instance
@@ -193,7 +276,12 @@ _recognizer_instance: Optional[ArcFaceRecognizer] = None
 
 
 def get_recognizer() -> ArcFaceRecognizer:
-    """Get or create global recognizer instance"""
+    """
+    Get or create global recognizer instance
+    
+    The instance (and its ONNX session) is shared by all threads;
+    InferenceSession.run is thread-safe.
+    """
     global _recognizer_instance
     if _recognizer_instance is None:
         _recognizer_instance = ArcFaceRecognizer()
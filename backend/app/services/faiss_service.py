@@ -3,12 +3,139 @@ FAISS Vector Database Service for Face Embeddings
 """
 
 import faiss
+import logging
 import numpy as np
 import pickle
 import os
+import queue
+import struct
+import threading
+import contextlib
+import functools
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 from typing import List, Tuple, Optional
 from app.core.config import settings
 
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process file locking (run a single process)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Embeddings needed before the flat index is swapped for a quantized one
+_MIN_QUANTIZER_TRAINING = 256
+
+# Neighbours per node in the HNSW coarse quantizer (FAISS_IVF_COARSE=hnsw)
+_HNSW_M = 32
+
+# Initial capacity of the student ID array (doubled as it fills)
+_SID_INITIAL_CAPACITY = 1024
+
+# Search cache: queries are bucketed by the signs of random projections
+# (SimHash), and a cached result is only reused for a query at least this
+# similar to the one that produced it, so near-identical consecutive frames
+# skip the index scan without ever borrowing another face's match
+_SIMHASH_BITS = 16
+_SEARCH_CACHE_MIN_SIMILARITY = 0.98
+
+# Seconds a caller waits on the search batcher before giving up
+_SEARCH_BATCH_TIMEOUT = 30.0
+
+# WAL file header: magic, generation of the snapshot its records apply on top of
+_WAL_FILE_HEADER = struct.Struct('<8sq')
+_WAL_MAGIC = b'FAISSWAL'
+
+# WAL record header: sequence number, student_id, vector count, metadata length
+_WAL_HEADER = struct.Struct('<qqII')
+
+
+def _as_normalized_batch(vectors: np.ndarray, copy: bool = True) -> np.ndarray:
+    """
+    Get vectors as a contiguous (N, dim) float32 array and L2-normalize it in place
+    
+    Args:
+        vectors: Single vector or (N, dim) array
+        copy: Always normalize a copy. Otherwise float32 C-contiguous input
+            (what ArcFaceRecognizer returns) is normalized in place without
+            allocating, and anything else is converted once
+        
+    Returns:
+        Normalized (N, dim) float32 array
+    """
+    if copy:
+        batch = np.array(vectors, dtype=np.float32, order='C', ndmin=2)
+    else:
+        batch = np.asarray(vectors, dtype=np.float32, order='C')
+        if batch.ndim == 1:
+            batch = batch[np.newaxis]
+    faiss.normalize_L2(batch)
+    return batch
+
+
+def _gpu_available() -> bool:
+    """True if FAISS_USE_GPU is set and faiss-gpu sees a CUDA device"""
+    return (
+        settings.FAISS_USE_GPU
+        and hasattr(faiss, 'StandardGpuResources')
+        and faiss.get_num_gpus() > 0
+    )
+
+
+def _pq_nbits(n: int) -> int:
+    """
+    Bits per PQ code for a training set of n vectors
+    
+    Each PQ codebook has 2^nbits centroids and k-means wants ~39 points per
+    centroid, so fewer bits are used until there is enough data (rebuilds
+    upgrade it to the full 8 bits).
+    """
+    return int(np.clip(np.log2(n / 39), 4, 8))
+
+
+def _fsync_file(path: str):
+    """Flush a file written by another library (e.g. faiss.write_index) to disk"""
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: str):
+    """Make renames in a directory durable (no-op where directories can't be opened, e.g. Windows)"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _locked(method):
+    """Run a FaissVectorDB method while holding the instance lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _disk_locked(method):
+    """
+    Run a FaissVectorDB method holding the instance lock and the index file lock
+    
+    The outermost call first catches up with whatever other processes wrote,
+    so the method reads and writes the files against the current state.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock, self._file_lock() as outermost:
+            if outermost:
+                self._sync_from_disk()
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class FaissVectorDB:
     """
@@ -27,75 +154,639 @@ class FaissVectorDB:
         
         # Initialize or load index
         self.index = None
-        self.student_ids = []  # Maps FAISS index to student IDs
-        self.embeddings_data = {}  # Stores additional metadata
+        self._mmapped = False  # index codes are a read-only view of the file
+        self._gpu_res = None  # faiss.StandardGpuResources, created on first GPU transfer
+        self._on_gpu = False  # index lives on the GPU (CPU copies are made to save/reconstruct)
+        self.ids_path = os.path.splitext(self.embeddings_path)[0] + '_ids.npy'
+        self._snapshot_files = ()  # index and student ID files of the loaded snapshot
         
-        self._load_or_create_index()
+        # Maps FAISS index to student IDs: a growable int64 array, of which the
+        # first _sid_len entries are in use (see the student_ids property)
+        self._sid_arr = np.empty(_SID_INITIAL_CAPACITY, dtype=np.int64)
+        self._sid_len = 0
+        self._unique_sids = set()  # distinct student IDs, kept in sync with the array
+        # Additional metadata per student (latest batch's), not per embedding:
+        # every vector of a batch shares it, so one entry per student suffices
+        self.student_metadata = {}
+        self._built_ntotal = 0  # index size when the IVF index was last trained
+        
+        # Additions since the last snapshot are appended to a write-ahead log
+        # instead of rewriting the whole index on every enrollment
+        self.wal_path = self.index_path + '.wal'
+        self._wal_file = None
+        self._wal_vectors = 0  # vectors in the WAL (not yet in the snapshot)
+        self._wal_offset = 0  # WAL bytes applied to (or written from) this instance
+        self._wal_seq = 0  # sequence number of the last WAL record applied
+        self._generation = 0  # bumped by every snapshot; the WAL names the one it extends
+        
+        # Processes sharing the files serialize reads and writes of them with
+        # an flock on this file (see _file_lock)
+        self.lock_path = self.index_path + '.lock'
+        self._lock_fd = None
+        self._file_lock_depth = 0
+        
+        # On-disk state (snapshot identity, WAL bytes applied) this instance
+        # has caught up with, so snapshots and WAL appends from other
+        # processes can be picked up
+        self._disk_state = None
+        self._last_stale_check = 0.0
+        
+        # Recent search results by SimHash bucket (see _cached_search)
+        self._search_cache = OrderedDict()
+        self._projections = np.random.RandomState(0).randn(_SIMHASH_BITS, self.dimension).astype(np.float32)
+        
+        # Training runs on worker threads alongside recognition; FAISS indexes
+        # are not safe to search while another thread mutates them
+        self._lock = threading.RLock()
+        
+        with self._lock, self._file_lock():
+            self._sync_from_disk()
+    
+    @property
+    def student_ids(self) -> np.ndarray:
+        """Student ID of each FAISS index position (int64 view; don't mutate)"""
+        return self._sid_arr[:self._sid_len]
+    
+    def _append_student_ids(self, student_id: int, count: int):
+        """Record count new index positions for a student, doubling capacity as needed"""
+        needed = self._sid_len + count
+        if needed > len(self._sid_arr):
+            capacity = max(len(self._sid_arr), _SID_INITIAL_CAPACITY)
+            while capacity < needed:
+                capacity *= 2
+            grown = np.empty(capacity, dtype=np.int64)
+            grown[:self._sid_len] = self._sid_arr[:self._sid_len]
+            self._sid_arr = grown
+        self._sid_arr[self._sid_len:needed] = student_id
+        self._sid_len = needed
+        self._unique_sids.add(int(student_id))
+    
+    def _set_student_ids(self, student_ids):
+        """Replace the student ID mapping (copied)"""
+        student_ids = np.asarray(student_ids, dtype=np.int64)
+        self._sid_arr = np.empty(max(len(student_ids), _SID_INITIAL_CAPACITY), dtype=np.int64)
+        self._sid_arr[:len(student_ids)] = student_ids
+        self._sid_len = len(student_ids)
+        self._unique_sids = set(np.unique(student_ids).tolist())
     
     def _load_or_create_index(self):
-        """Load existing index or create new one"""
-        if os.path.exists(self.index_path) and os.path.exists(self.embeddings_path):
+        """Load existing index or create new one, then replay the WAL (needs the file lock)"""
+        # The WAL may have been replaced along with the snapshot; reopen it on
+        # the next append instead of writing to an unlinked file
+        if self._wal_file is not None:
+            self._wal_file.close()
+            self._wal_file = None
+        
+        if os.path.exists(self.embeddings_path):
             self._load_index()
         else:
             self._create_index()
+            self._generation = 0
+        
+        self._wal_offset = 0
+        self._wal_seq = 0
+        self._wal_vectors = 0
+        self._replay_wal()
+    
+    def _current_disk_state(self) -> Tuple[Optional[Tuple[int, int]], int]:
+        """(snapshot identity as the manifest's (inode, mtime in ns) or None, WAL size in bytes)"""
+        try:
+            st = os.stat(self.embeddings_path)
+            index_state = (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            index_state = None
+        try:
+            wal_size = os.stat(self.wal_path).st_size
+        except FileNotFoundError:
+            wal_size = 0
+        return index_state, wal_size
+    
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """
+        Hold an exclusive flock on the index files across processes (reentrant)
+        
+        Taken around every read and write of the snapshot and WAL, so no
+        process appends to the WAL or writes a snapshot from a stale view, or
+        clears records it never loaded. Callers hold self._lock.
+        
+        Yields:
+            True for the outermost acquisition
+        """
+        if self._file_lock_depth == 0 and fcntl is not None:
+            os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+            self._lock_fd = os.open(self.lock_path, os.O_RDONLY | os.O_CREAT, 0o644)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        self._file_lock_depth += 1
+        try:
+            yield self._file_lock_depth == 1
+        finally:
+            self._file_lock_depth -= 1
+            if self._file_lock_depth == 0 and self._lock_fd is not None:
+                os.close(self._lock_fd)  # releases the flock
+                self._lock_fd = None
+    
+    def _sync_from_disk(self) -> bool:
+        """
+        Catch up with snapshots and WAL records written by other processes
+        
+        A new snapshot is loaded in full; otherwise only WAL records past the
+        last applied offset are replayed. Needs the file lock.
+        
+        Returns:
+            True if anything was loaded
+        """
+        index_state, wal_size = self._current_disk_state()
+        if (index_state, wal_size) == self._disk_state:
+            return False
+        
+        if self._disk_state is None or index_state != self._disk_state[0] or wal_size < self._wal_offset:
+            self._load_or_create_index()
+        else:
+            self._replay_wal()
+        self._disk_state = (index_state, self._wal_offset)
+        self._invalidate_search_cache()
+        return True
+    
+    def reload_if_stale(self) -> bool:
+        """
+        Reload the index if another process saved a snapshot or appended to the WAL
+        
+        Each API worker and camera process holds its own copy of the index, so
+        students enrolled through one worker are otherwise invisible to the
+        others until restart. The files are stat()ed at most once per
+        FAISS_RELOAD_INTERVAL seconds, so this is cheap to call per frame.
+        
+        Returns:
+            True if the index was reloaded
+        """
+        interval = settings.FAISS_RELOAD_INTERVAL
+        now = time.monotonic()
+        if interval <= 0 or now - self._last_stale_check < interval:
+            return False
+        
+        with self._lock:
+            self._last_stale_check = now
+            if self._current_disk_state() == self._disk_state:
+                return False
+            with self._file_lock():
+                return self._sync_from_disk()
+    
+    def _append_wal(self, student_id: int, batch: np.ndarray, metadata: Optional[dict]):
+        """Append one batch of added (normalized) vectors to the WAL (needs the file lock, caught up)"""
+        if self._wal_file is None:
+            os.makedirs(os.path.dirname(self.wal_path) or '.', exist_ok=True)
+            self._wal_file = open(self.wal_path, 'ab')
+        if self._wal_offset == 0:
+            # New WAL: its records apply on top of the current snapshot
+            header = _WAL_FILE_HEADER.pack(_WAL_MAGIC, self._generation)
+            self._wal_file.write(header)
+            self._wal_offset = len(header)
+        
+        meta = pickle.dumps(metadata) if metadata else b''
+        self._wal_seq += 1
+        self._wal_file.write(_WAL_HEADER.pack(self._wal_seq, student_id, len(batch), len(meta)))
+        self._wal_file.write(meta)
+        self._wal_file.write(batch.tobytes())
+        self._wal_file.flush()
+        self._wal_vectors += len(batch)
+        self._wal_offset += _WAL_HEADER.size + len(meta) + batch.nbytes
+        # Only this process's own record is new: everything before it was
+        # replayed under the same file lock
+        self._disk_state = (self._disk_state[0], self._wal_offset)
+    
+    def _replay_wal(self):
+        """
+        Apply WAL records past the last replayed offset (needs the file lock)
+        
+        The WAL names the snapshot generation it extends and numbers its
+        records, so a WAL left over from an older snapshot (a crash between
+        the snapshot and clearing the WAL) is discarded, and no record is
+        applied twice.
+        """
+        try:
+            with open(self.wal_path, 'rb') as f:
+                f.seek(self._wal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        
+        offset = 0
+        if self._wal_offset == 0:
+            magic, generation = _WAL_FILE_HEADER.unpack_from(data) if len(data) >= _WAL_FILE_HEADER.size else (None, None)
+            if magic != _WAL_MAGIC or generation != self._generation:
+                if data:
+                    logger.warning(
+                        "Discarding FAISS write-ahead log for snapshot generation %s (loaded generation %d)",
+                        generation, self._generation,
+                    )
+                with open(self.wal_path, 'r+b') as f:
+                    f.truncate(0)
+                return
+            offset = _WAL_FILE_HEADER.size
+        
+        replayed = 0
+        row_bytes = self.dimension * 4
+        while offset + _WAL_HEADER.size <= len(data):
+            seq, student_id, count, meta_len = _WAL_HEADER.unpack_from(data, offset)
+            body = offset + _WAL_HEADER.size
+            end = body + meta_len + count * row_bytes
+            if end > len(data):
+                break
+            offset = end
+            if seq <= self._wal_seq:
+                continue
+            self._wal_seq = seq
+            self._wal_vectors += count
+            
+            metadata = pickle.loads(data[body:body + meta_len]) if meta_len else None
+            vectors = np.frombuffer(data, dtype=np.float32, count=count * self.dimension, offset=body + meta_len)
+            self._ensure_writable()
+            self.index.add(vectors.reshape(count, self.dimension))
+            self._append_student_ids(student_id, count)
+            if metadata:
+                self.student_metadata[student_id] = metadata
+            replayed += count
+        self._wal_offset += offset
+        
+        # Cut off a torn final record from an interrupted write so new appends stay parseable
+        if offset < len(data):
+            with open(self.wal_path, 'r+b') as f:
+                f.truncate(self._wal_offset)
+        
+        if replayed:
+            logger.info("Replayed %d embeddings from the FAISS write-ahead log", replayed)
+    
+    def _clear_wal(self):
+        """Drop the WAL once its contents are in a snapshot"""
+        if self._wal_file is not None:
+            self._wal_file.close()
+            self._wal_file = None
+        if os.path.exists(self.wal_path):
+            os.remove(self.wal_path)
+        self._wal_vectors = 0
+        self._wal_offset = 0
+        self._wal_seq = 0
     
     def _create_index(self):
         """Create new FAISS index"""
         # Use Inner Product (cosine similarity) for normalized embeddings
         # This gives better results than L2 distance for face recognition
-        if settings.FAISS_INDEX_TYPE == "COSINE":
-            self.index = faiss.IndexFlatIP(self.dimension)  # Inner product for cosine similarity
-            print(f"Created new FAISS index with COSINE similarity, dimension {self.dimension}")
+        # (embeddings are L2-normalized, so an L2 index ranks identically but
+        # costs an extra subtraction and norm per comparison)
+        if settings.FAISS_QUANTIZER == "fp16" and not _gpu_available():
+            # Half-precision storage: half the memory and scan bandwidth, no
+            # training, and well below the precision that separates faces
+            # (on the GPU the flat index is stored as float16 by _to_device)
+            index = faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_fp16, self._metric())
+            logger.info("Created new FAISS index with %s float16 storage, dimension %d", settings.FAISS_INDEX_TYPE, self.dimension)
+        elif settings.FAISS_INDEX_TYPE == "COSINE":
+            index = faiss.IndexFlatIP(self.dimension)  # Inner product for cosine similarity
+            logger.info("Created new FAISS index with COSINE similarity, dimension %d", self.dimension)
         else:
-            self.index = faiss.IndexFlatL2(self.dimension)  # L2 distance
-            print(f"Created new FAISS index with L2 distance, dimension {self.dimension}")
+            index = faiss.IndexFlatL2(self.dimension)  # L2 distance
+            logger.info("Created new FAISS index with L2 distance, dimension %d", self.dimension)
         
-        self.student_ids = []
-        self.embeddings_data = {}
+        self.index = self._to_device(index)
+        self._set_student_ids([])
+        self.student_metadata = {}
+        self._mmapped = False
+        self._built_ntotal = 0
+    
+    def _to_device(self, index: faiss.Index) -> faiss.Index:
+        """
+        Move a CPU index to the GPU when FAISS_USE_GPU is set and faiss-gpu sees a device
+        
+        Flat indexes become GpuIndexFlat, so a search is one cuBLAS GEMM next to
+        the ArcFace forward pass. Indexes the GPU can't hold stay on the CPU.
+        """
+        self._on_gpu = False
+        if not _gpu_available():
+            return index
+        
+        try:
+            if self._gpu_res is None:
+                self._gpu_res = faiss.StandardGpuResources()
+            options = faiss.GpuClonerOptions()
+            options.useFloat16 = settings.FAISS_QUANTIZER == "fp16"
+            gpu_index = faiss.index_cpu_to_gpu(self._gpu_res, settings.ONNX_CUDA_DEVICE_ID, index, options)
+            self._on_gpu = True
+            return gpu_index
+        except Exception as e:
+            logger.warning("Keeping FAISS index on CPU: %s", e)
+            return index
+    
+    def _cpu_index(self) -> faiss.Index:
+        """The index itself, or a CPU copy of it if it lives on the GPU"""
+        if not self._on_gpu:
+            return self.index
+        
+        index = faiss.index_gpu_to_cpu(self.index)
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.set_direct_map_type(faiss.DirectMap.Array)  # not kept on the GPU
+        return index
+    
+    def _metric(self) -> int:
+        """FAISS metric for FAISS_INDEX_TYPE"""
+        return faiss.METRIC_L2 if settings.FAISS_INDEX_TYPE == "L2" else faiss.METRIC_INNER_PRODUCT
+    
+    def _is_flat(self) -> bool:
+        """Whether the current index is an uncompressed flat index"""
+        flat_types = (faiss.IndexFlat, faiss.GpuIndexFlat) if self._on_gpu else faiss.IndexFlat
+        return isinstance(self.index, flat_types)
+    
+    def _is_ivf(self) -> bool:
+        """Whether the current index is a trained IVF (inverted file) index"""
+        ivf_types = (faiss.IndexIVF, faiss.GpuIndexIVF) if self._on_gpu else faiss.IndexIVF
+        index = self.index
+        if isinstance(index, faiss.IndexRefine):
+            index = faiss.downcast_index(index.base_index)
+        return isinstance(index, ivf_types)
+    
+    def _build_ivf_index(self, vectors: np.ndarray) -> faiss.Index:
+        """
+        Train an IVF-PQ index with flat re-ranking on the given vectors
+        
+        nlist ~ sqrt(N) balances the coarse scan (nlist centroids) against the
+        inverted lists probed (nprobe * N / nlist codes), and PQ stores each
+        vector in dimension/8 bytes instead of dimension*4. The top
+        k * FAISS_RERANK_FACTOR candidates are re-ranked against the exact
+        vectors, so the recognition threshold is compared against exact scores
+        and rebuilds retrain on exact vectors rather than PQ reconstructions.
+        
+        Args:
+            vectors: (N, dim) normalized float32 training vectors
+            
+        Returns:
+            Trained (empty) IVF-PQ index with a flat re-rank stage
+        """
+        n = len(vectors)
+        m = self.dimension // 8
+        nbits = _pq_nbits(n)
+        metric = self._metric()
+        
+        if settings.FAISS_IVF_COARSE == "hnsw":
+            # IVF-HNSW: centroids are found by graph search instead of a scan,
+            # so more (smaller) lists are affordable; k-means still wants
+            # ~39 training points per centroid
+            nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))
+            quantizer = faiss.IndexHNSWFlat(self.dimension, _HNSW_M, metric)
+        else:
+            nlist = max(1, int(np.sqrt(n)))
+            quantizer = faiss.IndexFlatL2(self.dimension) if metric == faiss.METRIC_L2 else faiss.IndexFlatIP(self.dimension)
+        
+        ivf = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, m, nbits, metric)
+        ivf.train(vectors)
+        # Probing too few lists misses true matches before re-ranking can see them
+        ivf.nprobe = min(nlist, max(8, nlist // 4))
+        if settings.FAISS_IVF_COARSE == "hnsw":
+            # The graph search must return at least nprobe centroids
+            quantizer.hnsw.efSearch = max(quantizer.hnsw.efSearch, 2 * ivf.nprobe)
+        # Positional lookups (reconstruct_n on removal) need a direct map
+        ivf.set_direct_map_type(faiss.DirectMap.Array)
+        
+        index = faiss.IndexRefineFlat(ivf)
+        index.k_factor = settings.FAISS_RERANK_FACTOR
+        logger.info(
+            "Built IVF-PQ index with flat re-ranking: nlist=%d (%s coarse quantizer), nprobe=%d, %d-bit PQ, trained on %d embeddings",
+            nlist, settings.FAISS_IVF_COARSE, ivf.nprobe, nbits, n,
+        )
+        return self._to_device(index)
+    
+    def _build_quantized_index(self, vectors: np.ndarray) -> faiss.Index:
+        """
+        Train the FAISS_QUANTIZER index on the given vectors
+        
+        The scan reads 8-bit (sq8) or dimension/8-byte (pq) codes instead of
+        float32 vectors, and the top k * FAISS_RERANK_FACTOR candidates are
+        re-ranked against the exact vectors, so reported similarities stay exact.
+        
+        Args:
+            vectors: (N, dim) normalized float32 training vectors
+            
+        Returns:
+            Trained (empty) quantized index with a flat re-rank stage
+        """
+        if settings.FAISS_QUANTIZER == "pq":
+            nbits = _pq_nbits(len(vectors))
+            base = faiss.IndexPQ(self.dimension, self.dimension // 8, nbits, self._metric())
+            description = f"{nbits}-bit PQ"
+        else:
+            base = faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit, self._metric())
+            description = "SQ8"
+        base.train(vectors)
+        
+        index = faiss.IndexRefineFlat(base)
+        index.k_factor = settings.FAISS_RERANK_FACTOR
+        logger.info("Built %s index with flat re-ranking, trained on %d embeddings", description, len(vectors))
+        return self._to_device(index)
+    
+    @_disk_locked
+    def train_if_needed(self, embeddings: np.ndarray = None) -> bool:
+        """
+        Swap the flat index for the FAISS_QUANTIZER index once there is enough data to train it
+        
+        Args:
+            embeddings: Embeddings about to be added (used for training as well)
+            
+        Returns:
+            True if the index was replaced
+        """
+        if settings.FAISS_QUANTIZER not in ("sq8", "pq") or not self._is_flat():
+            return False
+        
+        new = _as_normalized_batch(np.vstack(embeddings), copy=False) if embeddings is not None and len(embeddings) else None
+        ntotal = self.index.ntotal
+        if ntotal + (0 if new is None else len(new)) < _MIN_QUANTIZER_TRAINING:
+            return False
+        
+        vectors = self._cpu_index().reconstruct_n(0, ntotal) if ntotal else np.empty((0, self.dimension), dtype=np.float32)
+        self.index = self._build_quantized_index(vectors if new is None else np.vstack([vectors, new]))
+        self._mmapped = False
+        self.index.add(vectors)
+        self._invalidate_search_cache()
+        
+        # The WAL only records additions, so a new index type needs a full snapshot
+        self.save_index()
+        return True
+    
+    @_disk_locked
+    def rebuild_index(self):
+        """
+        Rebuild the index for its current size
+        
+        Below FAISS_IVF_THRESHOLD embeddings this is a flat index (quantized
+        if FAISS_QUANTIZER is set); above it an IVF-PQ index is trained on the
+        stored embeddings (kept exactly by the re-rank stage). Called
+        automatically whenever the index doubles in size, and can be run
+        periodically (e.g. from cron) after large enrollments or removals.
+        """
+        ntotal = self.index.ntotal
+        vectors = self._cpu_index().reconstruct_n(0, ntotal) if ntotal else np.empty((0, self.dimension), dtype=np.float32)
+        student_ids, student_metadata = self.student_ids.copy(), self.student_metadata
+        
+        threshold = settings.FAISS_IVF_THRESHOLD
+        if threshold > 0 and ntotal >= threshold:
+            self.index = self._build_ivf_index(vectors)
+            self._mmapped = False
+            self._built_ntotal = ntotal
+        elif settings.FAISS_QUANTIZER in ("sq8", "pq") and ntotal >= _MIN_QUANTIZER_TRAINING:
+            self.index = self._build_quantized_index(vectors)
+            self._mmapped = False
+            self._built_ntotal = 0
+        else:
+            self._create_index()
+        
+        self.index.add(vectors)
+        self._invalidate_search_cache()
+        self._set_student_ids(student_ids)
+        self.student_metadata = student_metadata
+        
+        # The WAL only records additions, so a rebuild needs a full snapshot
+        self.save_index()
+    
+    def _needs_rebuild(self) -> bool:
+        """IVF index due: flat index crossed the threshold, or IVF index doubled since training"""
+        threshold = settings.FAISS_IVF_THRESHOLD
+        if threshold <= 0:
+            return False
+        if self._is_ivf():
+            return self.index.ntotal >= 2 * self._built_ntotal
+        return self.index.ntotal >= threshold
+    
+    def _ensure_writable(self):
+        """Copy a memory-mapped index into RAM before its first mutation"""
+        # Mutating a mapped index aborts the process inside FAISS (codes are a view)
+        if self._mmapped:
+            self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            self._mmapped = False
+    
+    def _snapshot_paths(self, generation: int) -> Tuple[str, str]:
+        """Index and student ID files written by the snapshot of one generation"""
+        return f"{self.index_path}.{generation}", f"{os.path.splitext(self.ids_path)[0]}.{generation}.npy"
     
     def _load_index(self):
         """Load existing FAISS index and metadata"""
         try:
-            # Load FAISS index
-            self.index = faiss.read_index(self.index_path)
-            
-            # Load embeddings metadata
+            # The metadata pickle is the snapshot's manifest: it names the index
+            # and student ID files of its generation (older saves use the
+            # fixed paths)
             with open(self.embeddings_path, 'rb') as f:
                 data = pickle.load(f)
-                self.student_ids = data.get('student_ids', [])
-                self.embeddings_data = data.get('embeddings_data', {})
+            self._generation = data.get('generation', 0)
+            if 'index_file' in data:
+                index_file = os.path.join(os.path.dirname(self.index_path), data['index_file'])
+                ids_file = os.path.join(os.path.dirname(self.ids_path), data['ids_file'])
+            else:
+                index_file, ids_file = self.index_path, self.ids_path
+            self._snapshot_files = (index_file, ids_file)
             
-            print(f"Loaded FAISS index with {self.index.ntotal} embeddings")
-        except Exception as e:
-            print(f"Error loading index: {e}")
+            # Load FAISS index (memory-mapped: pages are shared by every process
+            # that maps the file and only faulted in when searched)
+            # (a GPU copy is private to the process anyway, so it is read normally)
+            if settings.FAISS_MMAP and not _gpu_available():
+                # READ_ONLY: the file is never written through the mapping (writes
+                # go to a RAM copy, then a new file), so read-only deployments work
+                mmap_flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+                self.index = faiss.read_index(index_file, mmap_flag)
+                self._mmapped = True
+            else:
+                self.index = self._to_device(faiss.read_index(index_file))
+                self._mmapped = False
+            
+            # Older saves keep the student IDs in the pickle
+            if os.path.exists(ids_file):
+                self._set_student_ids(np.load(ids_file))
+            else:
+                self._set_student_ids(data.get('student_ids', []))
+            if 'student_metadata' in data:
+                self.student_metadata = data['student_metadata']
+            else:
+                # Older saves key metadata by FAISS position
+                self.student_metadata = {
+                    int(self._sid_arr[faiss_id]): metadata
+                    for faiss_id, metadata in data.get('embeddings_data', {}).items()
+                    if faiss_id < self._sid_len
+                }
+            
+            self._built_ntotal = self.index.ntotal if self._is_ivf() else 0
+            
+            if self.index.ntotal != self._sid_len:
+                logger.warning(
+                    "FAISS index has %d embeddings but %d student IDs; re-enroll or retrain to repair",
+                    self.index.ntotal, self._sid_len,
+                )
+            
+            logger.info("Loaded FAISS index with %d embeddings", self.index.ntotal)
+        except Exception:
+            logger.exception("Error loading index")
             self._create_index()
     
+    @_disk_locked
     def save_index(self):
-        """Save FAISS index and metadata to disk"""
+        """Save a full snapshot of the FAISS index and metadata, then clear the WAL"""
         try:
             # Create directory if it doesn't exist
             os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
             
-            # Save FAISS index
-            faiss.write_index(self.index, self.index_path)
+            # Write the index and student IDs to files named for the new
+            # generation and fsync them, then swap in the manifest that points
+            # at them: that single rename commits the snapshot, so a crash
+            # mid-save leaves the previous snapshot intact (plus the WAL), and
+            # processes that have the old index memory-mapped keep a
+            # consistent view
+            generation = self._generation + 1
+            index_file, ids_file = self._snapshot_paths(generation)
+            faiss.write_index(self._cpu_index(), index_file)
+            _fsync_file(index_file)
+            
+            # Student IDs as a raw int64 array, metadata as a pickle
+            with open(ids_file, 'wb') as f:
+                np.save(f, self.student_ids)
+                f.flush()
+                os.fsync(f.fileno())
             
-            # Save metadata
-            with open(self.embeddings_path, 'wb') as f:
+            tmp_embeddings_path = self.embeddings_path + '.tmp'
+            with open(tmp_embeddings_path, 'wb') as f:
                 pickle.dump({
-                    'student_ids': self.student_ids,
-                    'embeddings_data': self.embeddings_data
+                    'student_metadata': self.student_metadata,
+                    'generation': generation,
+                    'index_file': os.path.basename(index_file),
+                    'ids_file': os.path.basename(ids_file)
                 }, f)
+                f.flush()
+                os.fsync(f.fileno())
             
-            print(f"Saved FAISS index with {self.index.ntotal} embeddings")
-        except Exception as e:
-            print(f"Error saving index: {e}")
+            # The new files' directory entries must be durable before the manifest names them
+            for directory in {os.path.dirname(index_file), os.path.dirname(ids_file)}:
+                _fsync_dir(directory)
+            os.replace(tmp_embeddings_path, self.embeddings_path)
+            _fsync_dir(os.path.dirname(self.embeddings_path))
+            
+            self._clear_wal()
+            self._generation = generation
+            self._disk_state = self._current_disk_state()
+            
+            # The previous snapshot's files are no longer referenced (processes
+            # still mapping them keep their pages until they reload)
+            for path in self._snapshot_files:
+                if path not in (index_file, ids_file) and os.path.exists(path):
+                    os.remove(path)
+            self._snapshot_files = (index_file, ids_file)
+            
+            logger.info("Saved FAISS index with %d embeddings", self.index.ntotal)
+        except Exception:
+            logger.exception("Error saving index")
             raise
     
+    @_locked
     def add_embedding(
         self, 
         embedding: np.ndarray, 
         student_id: int,
-        metadata: dict = None
+        metadata: dict = None,
+        save: bool = True
     ) -> int:
         """
         Add face embedding to the index
@@ -104,33 +795,88 @@ class FaissVectorDB:
             embedding: Face embedding vector
             student_id: Student ID
             metadata: Additional metadata
+            save: Persist the embedding (WAL append)
             
         Returns:
             Index ID of the added embedding
         """
-        # Ensure embedding is the right shape
-        if embedding.ndim == 1:
-            embedding = embedding.reshape(1, -1)
+        return self.add_batch(embedding, student_id, metadata, save=save)[0]
+    
+    @_disk_locked
+    def add_batch(
+        self,
+        embeddings: np.ndarray,
+        student_id: int,
+        metadata: dict = None,
+        save: bool = True
+    ) -> List[int]:
+        """
+        Add several embeddings for one student with a single index.add and save
         
-        # Normalize embedding for cosine similarity
-        embedding = embedding / np.linalg.norm(embedding, axis=1, keepdims=True)
+        Args:
+            embeddings: (N, dim) array or list of embedding vectors
+            student_id: Student ID
+            metadata: Additional metadata (stored once for the student)
+            save: Persist the batch (WAL append; full snapshot every FAISS_WAL_COMPACT vectors)
+            
+        Returns:
+            Index IDs of the added embeddings
+        """
+        # Contiguous float32 (N, dim), L2-normalized in place for cosine similarity
+        # (recognizer embeddings are already unit-length float32, so no copy is made)
+        batch = _as_normalized_batch(np.vstack(embeddings) if isinstance(embeddings, list) else embeddings, copy=False)
         
         # Add to FAISS index
-        self.index.add(embedding.astype(np.float32))
+        self._ensure_writable()
+        self.index.add(batch)
+        
+        self._invalidate_search_cache()
         
         # Store student ID mapping
-        faiss_id = len(self.student_ids)
-        self.student_ids.append(student_id)
+        first_id = self._sid_len
+        faiss_ids = list(range(first_id, first_id + len(batch)))
+        self._append_student_ids(student_id, len(batch))
         
         # Store metadata
         if metadata:
-            self.embeddings_data[faiss_id] = metadata
+            self.student_metadata[student_id] = metadata
         
-        # Save to disk
-        self.save_index()
+        # Persist: append to the WAL, rewriting the snapshot only once it grows large
+        if save:
+            self._append_wal(student_id, batch, metadata)
+            if self._needs_rebuild():
+                self.rebuild_index()
+            elif self._wal_vectors >= settings.FAISS_WAL_COMPACT:
+                self.save_index()
+        
+        return faiss_ids
+    
+    @_disk_locked
+    def replace_student_embeddings(
+        self,
+        embeddings: np.ndarray,
+        student_id: int,
+        metadata: dict = None
+    ) -> List[int]:
+        """
+        Swap a student's embeddings for new ones in one locked step
         
-        return faiss_id
+        Used for retraining: the new embeddings are computed first, so a failed
+        retrain never leaves the student without any.
+        
+        Args:
+            embeddings: (N, dim) array or list of embedding vectors
+            student_id: Student ID
+            metadata: Additional metadata (stored once for the student)
+            
+        Returns:
+            Index IDs of the added embeddings
+        """
+        if self.get_student_embedding_count(student_id):
+            self.remove_student_embeddings(student_id)
+        return self.add_batch(embeddings, student_id, metadata)
     
+    @_locked
     def add_multiple_embeddings(
         self,
         embeddings: List[np.ndarray],
@@ -141,13 +887,105 @@ class FaissVectorDB:
         Add multiple face embeddings for a single student
         
         Args:
-            embeddings: List of face embedding vectors
+            embeddings: List of face embedding vectors, or an (N, dim) array
             student_id: Student ID
             metadata: Additional metadata
         """
-        for embedding in embeddings:
-            self.add_embedding(embedding, student_id, metadata)
+        if len(embeddings) == 0:
+            return
+        self.add_batch(embeddings, student_id, metadata)
+    
+    def _collect_matches(
+        self,
+        scores: np.ndarray,
+        indices: np.ndarray,
+        threshold: float
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Turn raw (K, k) search results into per-query match lists with NumPy
+        
+        Args:
+            scores: Distances or inner products from index.search
+            indices: Index positions from index.search (-1 for missing hits)
+            threshold: Minimum cosine similarity
+            
+        Returns:
+            One list of (student_id, similarity) tuples per query, best first,
+            with one entry per student (its best embedding)
+        """
+        # Vectors are unit length, so both metrics map exactly onto cosine
+        # similarity and FACE_RECOGNITION_THRESHOLD means the same thing for
+        # either index type; rows stay sorted best-first
+        if self.index.metric_type == faiss.METRIC_L2:
+            similarities = 1.0 - scores / 2.0  # squared L2 = 2 - 2*cos
+        else:
+            similarities = scores  # inner product == cosine
+        
+        accepted = (indices >= 0) & (indices < self._sid_len) & (similarities >= threshold)
+        # Gather student IDs for all hits at once (rejected hits read a valid dummy slot)
+        hit_student_ids = self._sid_arr[np.where(accepted, indices, 0)]
+        
+        results = []
+        for row_student_ids, row_similarities, row_accepted in zip(hit_student_ids, similarities, accepted):
+            matches = {}
+            for student_id, similarity in zip(row_student_ids[row_accepted].tolist(), row_similarities[row_accepted].tolist()):
+                # First hit per student is its best (rows are sorted)
+                matches.setdefault(student_id, similarity)
+            results.append(list(matches.items()))
+        return results
     
+    def _invalidate_search_cache(self):
+        """Drop cached search results after the index contents change"""
+        self._search_cache.clear()
+    
+    def _cached_search(self, queries: np.ndarray, k: int, threshold: float) -> List[List[Tuple[int, float]]]:
+        """
+        Search normalized queries, reusing results cached for near-identical queries
+        
+        Misses are searched together in one index call.
+        
+        Args:
+            queries: (K, dim) normalized float32 queries
+            k: Number of nearest neighbors per query
+            threshold: Similarity threshold for matching
+            
+        Returns:
+            One list of (student_id, similarity) tuples per query, best first
+        """
+        k = min(k, self.index.ntotal)
+        cache_size = settings.SEARCH_CACHE_SIZE
+        if cache_size <= 0:
+            scores, indices = self.index.search(queries, k)
+            return self._collect_matches(scores, indices, threshold)
+        
+        # SimHash bucket per query: one small GEMM, sign bits packed into bytes
+        buckets = np.packbits((queries @ self._projections.T) > 0, axis=1)
+        keys = [(bucket.tobytes(), k, threshold) for bucket in buckets]
+        
+        results = [None] * len(queries)
+        misses = []
+        for i, key in enumerate(keys):
+            entry = self._search_cache.get(key)
+            if entry is not None and float(entry[0] @ queries[i]) >= _SEARCH_CACHE_MIN_SIMILARITY:
+                self._search_cache.move_to_end(key)
+                results[i] = list(entry[1])
+            else:
+                misses.append(i)
+        
+        if misses:
+            scores, indices = self.index.search(queries[misses], k)
+            for i, matches in zip(misses, self._collect_matches(scores, indices, threshold)):
+                results[i] = matches
+                self._search_cache[keys[i]] = (queries[i].copy(), matches)
+                self._search_cache.move_to_end(keys[i])
+            while len(self._search_cache) > cache_size:
+                self._search_cache.popitem(last=False)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Search cache: %d hits, %d misses", len(queries) - len(misses), len(misses))
+        return results
+    
+    @_locked
     def search(
         self, 
         query_embedding: np.ndarray, 
@@ -165,64 +1003,59 @@ class FaissVectorDB:
         Returns:
             List of (student_id, similarity) tuples sorted by confidence
         """
-        print(f"[FAISS] Searching with {self.index.ntotal} embeddings in index")
+        logger.debug("Searching with %d embeddings in index", self.index.ntotal)
         
         if self.index.ntotal == 0:
-            print("[FAISS] Index is empty, no embeddings to search")
+            logger.debug("Index is empty, no embeddings to search")
             return []
         
         k = k or getattr(settings, 'FAISS_K_NEIGHBORS', 5)
         threshold = threshold or settings.FACE_RECOGNITION_THRESHOLD
-        print(f"[FAISS] Using k={k}, threshold={threshold}")
-        
-        # Ensure query is the right shape
-        if query_embedding.ndim == 1:
-            query_embedding = query_embedding.reshape(1, -1)
-        
-        # Normalize query for cosine similarity
-        query_embedding = query_embedding / np.linalg.norm(query_embedding, axis=1, keepdims=True)
-        
-        # Search top-k matches
-        scores, indices = self.index.search(query_embedding.astype(np.float32), min(k, self.index.ntotal))
-        
-        print(f"[FAISS] Search results - scores: {scores[0]}, indices: {indices[0]}")
-        
-        # Collect all matches and apply verification
-        candidate_matches = {}
-        
-        for score, idx in zip(scores[0], indices[0]):
-            if idx >= 0 and idx < len(self.student_ids):
-                student_id = self.student_ids[idx]
-                
-                # For cosine similarity (IndexFlatIP), higher score is better (range: -1 to 1)
-                # For L2 distance (IndexFlatL2), lower score is better
-                if settings.FAISS_INDEX_TYPE == "COSINE":
-                    similarity = float(score)  # Already in range [0, 1] for normalized vectors
-                else:
-                    # Convert L2 distance to similarity
-                    similarity = 1 / (1 + score)
-                
-                print(f"[FAISS] Candidate - idx: {idx}, student_id: {student_id}, score: {score:.4f}, similarity: {similarity:.4f}")
-                
-                # Keep track of best match per student (in case multiple embeddings)
-                if student_id not in candidate_matches or similarity > candidate_matches[student_id]:
-                    candidate_matches[student_id] = similarity
-        
-        # Filter by threshold and sort by confidence
-        results = []
-        for student_id, similarity in candidate_matches.items():
-            if similarity >= threshold:
-                results.append((student_id, similarity))
-                print(f"[FAISS] Match accepted - student_id: {student_id}, similarity: {similarity:.4f}")
-            else:
-                print(f"[FAISS] Match rejected - student_id: {student_id}, similarity: {similarity:.4f} < threshold {threshold}")
+        logger.debug("Using k=%d, threshold=%s", k, threshold)
+        
+        # Normalize query for cosine similarity (inner product == cosine on unit vectors)
+        query_embedding = _as_normalized_batch(query_embedding, copy=False)
         
-        # Sort by similarity (highest first)
-        results.sort(key=lambda x: x[1], reverse=True)
+        # Best match per student above the threshold, highest first
+        results = self._cached_search(query_embedding, k, threshold)[0]
         
-        print(f"[FAISS] Final results: {len(results)} matches above threshold")
+        logger.debug("Final results: %d matches above threshold", len(results))
         return results
     
+    @_locked
+    def search_batch(
+        self,
+        queries: np.ndarray,
+        k: int = 1,
+        threshold: float = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Search for several query embeddings with one index call
+        
+        Args:
+            queries: (K, dim) array of query embeddings
+            k: Number of nearest neighbors per query
+            threshold: Similarity threshold for matching (higher = stricter)
+            
+        Returns:
+            One list of (student_id, similarity) tuples per query, best first
+        """
+        queries = _as_normalized_batch(queries, copy=False)
+        if self.index.ntotal == 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+        
+        threshold = threshold or settings.FACE_RECOGNITION_THRESHOLD
+        
+        results = self._cached_search(queries, k, threshold)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Batch search: %d queries, %d matched above threshold %s",
+                len(queries), sum(map(bool, results)), threshold
+            )
+        return results
+    
+    @_disk_locked
     def remove_student_embeddings(self, student_id: int):
         """
         Remove all embeddings for a student
@@ -231,62 +1064,159 @@ class FaissVectorDB:
         Args:
             student_id: Student ID to remove
         """
-        # Get indices to keep
-        keep_indices = [i for i, sid in enumerate(self.student_ids) if sid != student_id]
+        ids = self.student_ids.copy()
+        keep = ids != student_id
         
-        if len(keep_indices) == len(self.student_ids):
-            print(f"No embeddings found for student {student_id}")
+        if keep.all():
+            logger.info("No embeddings found for student %d", student_id)
             return
         
+        self._invalidate_search_cache()
+        
         # Rebuild index with remaining embeddings
-        if len(keep_indices) > 0:
-            # Extract embeddings to keep
-            embeddings_to_keep = []
-            for i in keep_indices:
-                # Get embedding from index
-                embedding = faiss.rev_swig_ptr(self.index.reconstruct(i), self.dimension)
-                embeddings_to_keep.append(embedding)
-            
-            # Create new index
-            self._create_index()
-            
-            # Re-add embeddings
-            embeddings_array = np.array(embeddings_to_keep, dtype=np.float32)
-            self.index.add(embeddings_array)
-            
-            # Update student IDs
-            self.student_ids = [self.student_ids[i] for i in keep_indices]
-            
-            # Update metadata
-            new_embeddings_data = {}
-            for new_idx, old_idx in enumerate(keep_indices):
-                if old_idx in self.embeddings_data:
-                    new_embeddings_data[new_idx] = self.embeddings_data[old_idx]
-            self.embeddings_data = new_embeddings_data
+        # (one contiguous (N, D) copy out of the index, filtered by a row mask)
+        vectors = self._cpu_index().reconstruct_n(0, self.index.ntotal)
+        student_metadata = self.student_metadata
+        student_metadata.pop(student_id, None)
+        
+        if not self._is_flat():
+            # Keep the trained quantizer and codebooks; only the codes are re-added
+            self._ensure_writable()
+            self.index.reset()
+            self._set_student_ids([])
         else:
-            # No embeddings left, create empty index
             self._create_index()
+        self.student_metadata = student_metadata
+        if keep.any():
+            self.index.add(np.ascontiguousarray(vectors[keep]))
+            self._set_student_ids(ids[keep])
         
         # Save
         self.save_index()
-        print(f"Removed embeddings for student {student_id}")
+        logger.info("Removed embeddings for student %d", student_id)
     
+    @_locked
     def get_student_embedding_count(self, student_id: int) -> int:
         """Get number of embeddings for a student"""
-        return self.student_ids.count(student_id)
+        return int(np.count_nonzero(self.student_ids == student_id))
+    
+    def unique_student_count(self) -> int:
+        """Get number of distinct students in the index"""
+        return len(self._unique_sids)
     
     def get_total_embeddings(self) -> int:
         """Get total number of embeddings in the index"""
         return self.index.ntotal
     
+    @_disk_locked
     def clear_index(self):
         """Clear all embeddings from the index"""
+        self._invalidate_search_cache()
         self._create_index()
         self.save_index()
 
 
+class SearchBatcher:
+    """
+    Coalesces concurrent searches from request and camera threads into one index call
+    
+    Callers block on a future while a single daemon thread drains the queue:
+    everything queued when it wakes (up to max_batch queries, optionally
+    waiting max_wait_ms for more) is stacked and searched with one
+    search_batch call, so concurrent frames share one BLAS/SIMD pass instead
+    of contending for the index. Under no load nothing waits unless
+    max_wait_ms is set.
+    """
+    
+    def __init__(self, faiss_db: FaissVectorDB, max_batch: int = None, max_wait_ms: float = None):
+        self.faiss_db = faiss_db
+        self.max_batch = settings.SEARCH_BATCH_MAX if max_batch is None else max_batch
+        self.max_wait = (settings.SEARCH_BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self._queue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+    
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 1,
+        threshold: float = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Same contract as FaissVectorDB.search_batch, batched with concurrent callers
+        
+        Args:
+            queries: (K, dim) array of query embeddings
+            k: Number of nearest neighbors per query
+            threshold: Similarity threshold for matching (higher = stricter)
+            
+        Returns:
+            One list of (student_id, similarity) tuples per query, best first
+        """
+        queries = np.atleast_2d(queries)
+        if self.max_batch <= 1 or len(queries) == 0:
+            return self.faiss_db.search_batch(queries, k, threshold)
+        
+        self._ensure_started()
+        future = Future()
+        self._queue.put((queries, k, threshold, future))
+        # Bounded so a stuck batcher fails requests instead of hanging them
+        return future.result(timeout=_SEARCH_BATCH_TIMEOUT)
+    
+    def _ensure_started(self):
+        """Start the worker thread on first use (after any gunicorn fork)"""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    thread = threading.Thread(target=self._run, name="faiss-search-batcher", daemon=True)
+                    thread.start()
+                    self._thread = thread
+    
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            try:
+                rows = len(pending[0][0])
+                deadline = time.monotonic() + self.max_wait
+                while rows < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    pending.append(item)
+                    rows += len(item[0])
+                self._flush(pending)
+            except Exception as e:
+                # Keep the thread alive; fail whichever callers are still waiting
+                logger.exception("Search batcher error: %s", e)
+                for *_, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    def _flush(self, pending: list):
+        """Search each (k, threshold) group with one call and resolve its futures"""
+        groups = {}
+        for item in pending:
+            groups.setdefault(item[1:3], []).append(item)
+        
+        for (k, threshold), items in groups.items():
+            try:
+                results = self.faiss_db.search_batch(np.vstack([queries for queries, *_ in items]), k, threshold)
+            except Exception as e:
+                for *_, future in items:
+                    future.set_exception(e)
+                continue
+            
+            start = 0
+            for queries, _, _, future in items:
+                future.set_result(results[start:start + len(queries)])
+                start += len(queries)
+
+
 # Global FAISS instance
 _faiss_instance: Optional[FaissVectorDB] = None
+_search_batcher_instance: Optional[SearchBatcher] = None
 
 
 def get_faiss_db() -> FaissVectorDB:
@@ -295,3 +1225,11 @@ def get_faiss_db() -> FaissVectorDB:
     if _faiss_instance is None:
         _faiss_instance = FaissVectorDB()
     return _faiss_instance
+
+
+def get_search_batcher() -> SearchBatcher:
+    """Get or create the global search batcher for the global FAISS instance"""
+    global _search_batcher_instance
+    if _search_batcher_instance is None:
+        _search_batcher_instance = SearchBatcher(get_faiss_db())
+    return _search_batcher_instance
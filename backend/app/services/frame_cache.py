@@ -0,0 +1,204 @@
+"""
+Decoded training frame cache
+Keeps each student's decoded frames in an uncompressed .npz file on RAM-backed
+storage so retraining can reuse them without re-decoding uploads. Frames keep
+their own shapes (no padding), at most FRAME_CACHE_MAX_FRAMES are kept per
+student, and the oldest entries are evicted beyond FRAME_CACHE_MAX_MB.
+"""
+
+import os
+import glob
+import time
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_FILE_PATTERN = "student_{}_frames.npz"
+
+
+def _cache_dir() -> Optional[str]:
+    """Cache directory: settings.FRAME_CACHE_DIR, else /dev/shm if usable, else None (disabled)"""
+    if settings.FRAME_CACHE_TTL <= 0:
+        return None
+    if settings.FRAME_CACHE_DIR:
+        os.makedirs(settings.FRAME_CACHE_DIR, exist_ok=True)
+        return settings.FRAME_CACHE_DIR
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
+
+
+def _cache_path(cache_dir: str, student_id: int) -> str:
+    return os.path.join(cache_dir, _FILE_PATTERN.format(student_id))
+
+
+def _pack_frames(frames) -> dict:
+    """
+    Flatten frames into one pixel buffer plus their shapes
+
+    At most FRAME_CACHE_MAX_FRAMES frames are kept, evenly spaced over the input.
+    """
+    if len(frames) > settings.FRAME_CACHE_MAX_FRAMES:
+        keep = np.linspace(0, len(frames) - 1, settings.FRAME_CACHE_MAX_FRAMES).round().astype(int)
+        frames = [frames[i] for i in keep]
+    return {
+        'shapes': np.array([frame.shape for frame in frames], dtype=np.int64),
+        'pixels': np.concatenate([np.ascontiguousarray(frame, dtype=np.uint8).ravel() for frame in frames])
+    }
+
+
+def _evict(cache_dir: str, keep_path: str) -> bool:
+    """
+    Remove the oldest entries until the cache fits FRAME_CACHE_MAX_MB
+
+    Args:
+        cache_dir: Cache directory
+        keep_path: Entry just written (evicted only if it alone is too large)
+
+    Returns:
+        True if keep_path is still cached
+    """
+    limit = settings.FRAME_CACHE_MAX_MB * 1024 * 1024
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir, _FILE_PATTERN.format("*"))):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue  # removed concurrently
+        entries.append((path == keep_path, st.st_mtime, st.st_size, path))
+
+    if os.path.exists(keep_path) and os.path.getsize(keep_path) > limit:
+        os.remove(keep_path)
+        return False
+
+    # Oldest first, the new entry last
+    entries.sort()
+    total = sum(size for _, _, size, _ in entries)
+    for _, _, size, path in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+        logger.debug("Evicted cached frames %s (cache over %d MB)", path, settings.FRAME_CACHE_MAX_MB)
+    return os.path.exists(keep_path)
+
+
+def save_frames(student_id: int, frames) -> bool:
+    """
+    Cache a student's decoded frames, replacing any previous entry
+
+    Args:
+        student_id: Student ID
+        frames: List of BGR frames, or an (N, H, W, 3) array
+
+    Returns:
+        True if the frames were cached
+    """
+    cache_dir = _cache_dir()
+    if cache_dir is None or len(frames) == 0:
+        return False
+
+    path = _cache_path(cache_dir, student_id)
+    tmp_path = f"{path}.tmp.npz"
+    try:
+        packed = _pack_frames(frames)
+        np.savez(tmp_path, **packed)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not cache frames for student %d: %s", student_id, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    if not _evict(cache_dir, path):
+        logger.warning("Frames for student %d exceed FRAME_CACHE_MAX_MB; not cached", student_id)
+        return False
+    logger.debug("Cached %d frames for student %d at %s", len(packed['shapes']), student_id, path)
+    return True
+
+
+def load_frames(student_id: int) -> Optional[List[np.ndarray]]:
+    """
+    Load a student's cached frames
+
+    Args:
+        student_id: Student ID
+
+    Returns:
+        List of BGR frames (views into one buffer), or None if nothing is cached
+    """
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return None
+
+    path = _cache_path(cache_dir, student_id)
+    try:
+        with np.load(path) as data:
+            shapes, pixels = data['shapes'], data['pixels']
+    except FileNotFoundError:
+        return None
+
+    frames = []
+    offset = 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        frames.append(pixels[offset:offset + size].reshape(shape))
+        offset += size
+    return frames
+
+
+def cached_student_ids() -> List[int]:
+    """IDs of students with cached frames"""
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return []
+
+    prefix, suffix = _FILE_PATTERN.split("{}")
+    student_ids = []
+    for path in glob.glob(os.path.join(cache_dir, _FILE_PATTERN.format("*"))):
+        name = os.path.basename(path)[len(prefix):-len(suffix)]
+        if name.isdigit():
+            student_ids.append(int(name))
+    return sorted(student_ids)
+
+
+def remove_frames(student_id: int):
+    """Drop a student's cached frames"""
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return
+
+    path = _cache_path(cache_dir, student_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def purge_expired() -> int:
+    """
+    Delete cache entries older than settings.FRAME_CACHE_TTL
+
+    Returns:
+        Number of entries removed
+    """
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return 0
+
+    cutoff = time.time() - settings.FRAME_CACHE_TTL
+    removed = 0
+    for path in glob.glob(os.path.join(cache_dir, _FILE_PATTERN.format("*"))):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue  # removed concurrently
+    return removed
@@ -0,0 +1,209 @@
+"""
+Shared ONNX Runtime session factory for the detection and recognition models
+"""
+
+import logging
+import os
+from typing import TYPE_CHECKING, Dict, Optional, Sequence, Tuple
+from app.core.config import settings
+
+# onnx/onnxruntime are imported when a session is first built, not when this
+# module is imported, so importing the app (e.g. in a preloading gunicorn
+# master) doesn't load the runtime or touch the GPU
+if TYPE_CHECKING:
+    import onnxruntime as ort
+
+logger = logging.getLogger(__name__)
+
+
+def free_dimension_overrides(model_path: str, input_shape: Sequence[Optional[int]]) -> Dict[str, int]:
+    """
+    Map the symbolic dimensions of a model's first input to fixed sizes
+    
+    Args:
+        model_path: Path to the ONNX model
+        input_shape: Size per dimension (None keeps that dimension dynamic)
+        
+    Returns:
+        Dictionary of symbolic dimension name -> size
+    """
+    import onnx
+    
+    model = onnx.load(model_path, load_external_data=False)
+    dims = model.graph.input[0].type.tensor_type.shape.dim
+    return {
+        dim.dim_param: size
+        for dim, size in zip(dims, input_shape)
+        if dim.dim_param and size is not None
+    }
+
+
+def create_session_options(dim_overrides: Dict[str, int] = None) -> "ort.SessionOptions":
+    """
+    Build session options shared by all models
+    
+    Args:
+        dim_overrides: Symbolic input dimensions to pin to fixed sizes
+        
+    Returns:
+        Configured SessionOptions
+    """
+    import onnxruntime as ort
+    
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # Conv backbones are a single chain of ops; parallelism comes from intra-op threads
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = settings.ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = 1  # unused in sequential mode; don't spawn a second pool
+    # Fixed shapes let the planner pre-size buffers and fold shape computations
+    for name, size in (dim_overrides or {}).items():
+        options.add_free_dimension_override_by_name(name, size)
+    return options
+
+
+def optimized_model_path(model_path: str, dim_overrides: Dict[str, int] = None) -> str:
+    """
+    Path of the cached graph-optimized model, e.g. models/det_10g.opt-1.18.1-cpu.onnx
+    
+    ORT_ENABLE_ALL output is specific to the runtime version, execution
+    provider and pinned input dimensions, so all of them are part of the name.
+    """
+    import onnxruntime as ort
+    
+    device = "cuda" if "CUDAExecutionProvider" in ort.get_available_providers() else "cpu"
+    base, ext = os.path.splitext(model_path)
+    shape = "".join(f"-{name}{size}" for name, size in sorted((dim_overrides or {}).items()))
+    return f"{base}.opt-{ort.__version__}-{device}{shape}{ext}"
+
+
+def _create_cached_session(
+    model_path: str,
+    options: "ort.SessionOptions",
+    providers: list,
+    dim_overrides: Dict[str, int] = None
+) -> "ort.InferenceSession":
+    """
+    Create a session, reusing (or writing) the cached optimized graph
+    
+    The cache is written to a per-process temporary file and renamed into
+    place, so workers starting together never read a partial model.
+    """
+    import onnxruntime as ort
+    
+    # TensorRT compiles subgraphs into engines, which can't be serialized back to ONNX
+    uses_tensorrt = any(_provider_name(p) == 'TensorrtExecutionProvider' for p in providers)
+    if not settings.ONNX_OPTIMIZED_MODEL_CACHE or uses_tensorrt:
+        return ort.InferenceSession(model_path, sess_options=options, providers=providers)
+    
+    cache_path = optimized_model_path(model_path, dim_overrides)
+    
+    if os.path.exists(cache_path):
+        # Already optimized offline; skip re-running the graph transformers
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return ort.InferenceSession(cache_path, sess_options=options, providers=providers)
+        except Exception as e:
+            logger.warning("Ignoring unusable optimized model cache %s: %s", cache_path, e)
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    options.optimized_model_filepath = tmp_path
+    try:
+        session = ort.InferenceSession(model_path, sess_options=options, providers=providers)
+    finally:
+        options.optimized_model_filepath = ""
+    
+    if os.path.exists(tmp_path):
+        os.replace(tmp_path, cache_path)
+        logger.info("Saved optimized model to %s", cache_path)
+    
+    return session
+
+
+def _provider_name(provider) -> str:
+    """Name of a provider given as a string or a (name, options) tuple"""
+    return provider if isinstance(provider, str) else provider[0]
+
+
+def tensorrt_provider() -> Tuple[str, Dict[str, object]]:
+    """
+    TensorRT execution provider with a persistent engine cache
+    
+    Building engines takes minutes; with the cache only the first startup
+    (or a model/shape change) pays for it. Input shapes must be static,
+    which create_session's input_shape pinning provides.
+    """
+    os.makedirs(settings.TRT_ENGINE_CACHE_PATH, exist_ok=True)
+    return ('TensorrtExecutionProvider', {
+        'device_id': settings.ONNX_CUDA_DEVICE_ID,
+        'trt_fp16_enable': settings.TRT_FP16,
+        'trt_engine_cache_enable': True,
+        'trt_engine_cache_path': settings.TRT_ENGINE_CACHE_PATH,
+        'trt_max_workspace_size': 2 << 30,
+    })
+
+
+def cuda_provider() -> Tuple[str, Dict[str, object]]:
+    """
+    CUDA execution provider with tuned options
+    
+    EXHAUSTIVE cuDNN algorithm search benchmarks convolution kernels once per
+    input shape (shapes are pinned, so only at startup); with an FP16 model
+    this lets cuDNN pick Tensor Core kernels.
+    """
+    return ('CUDAExecutionProvider', {
+        'device_id': settings.ONNX_CUDA_DEVICE_ID,
+        'cudnn_conv_algo_search': 'EXHAUSTIVE',
+        'do_copy_in_default_stream': True,
+    })
+
+
+def create_session(model_path: str, input_shape: Sequence[Optional[int]] = None) -> "ort.InferenceSession":
+    """
+    Create an inference session, preferring TensorRT/CUDA and falling back to CPU
+    
+    Args:
+        model_path: Path to the ONNX model
+        input_shape: Sizes for symbolic input dimensions (None entries stay dynamic)
+        
+    Returns:
+        ONNX Runtime inference session
+    """
+    import onnxruntime as ort
+    
+    dim_overrides = free_dimension_overrides(model_path, input_shape) if input_shape else {}
+    
+    # Try TensorRT, then CUDA, then fall back to CPU
+    provider_chains = []
+    if settings.ONNX_TENSORRT and 'TensorrtExecutionProvider' in ort.get_available_providers():
+        provider_chains.append([tensorrt_provider(), cuda_provider(), 'CPUExecutionProvider'])
+    provider_chains.append([cuda_provider(), 'CPUExecutionProvider'])
+    
+    session = None
+    for providers in provider_chains:
+        try:
+            session = _create_cached_session(model_path, create_session_options(dim_overrides), providers, dim_overrides)
+            break
+        except Exception as e:
+            logger.warning("Failed to initialize with %s: %s", _provider_name(providers[0]), e)
+    
+    if session is None:
+        logger.warning("Falling back to CPU execution")
+        session = ort.InferenceSession(
+            model_path,
+            sess_options=create_session_options(dim_overrides),
+            providers=['CPUExecutionProvider']
+        )
+    
+    # Log which provider is being used
+    available_providers = session.get_providers()
+    logger.info("ONNX Runtime providers available: %s", available_providers)
+    if 'TensorrtExecutionProvider' in available_providers:
+        logger.info("GPU acceleration enabled (TensorRT)")
+    elif 'CUDAExecutionProvider' in available_providers:
+        logger.info("GPU acceleration enabled (CUDA)")
+    else:
+        logger.warning("Running on CPU (CUDA not available)")
+    
+    return session
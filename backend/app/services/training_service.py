@@ -2,15 +2,18 @@
 Training service for face recognition model
 """
 
+import logging
 import numpy as np
 import pickle
 from typing import List, Dict
-from app.services.face_detection import get_detector
+from app.services.face_detection import DetectionCache, get_detector
 from app.services.face_recognition import get_recognizer
-from app.services.faiss_service import get_faiss_db
+from app.services.faiss_service import get_faiss_db, get_search_batcher
 from app.core.config import settings
 import os
 
+logger = logging.getLogger(__name__)
+
 
 class FaceRecognitionTrainer:
     """
@@ -21,67 +24,80 @@ class FaceRecognitionTrainer:
         self.detector = get_detector()
         self.recognizer = get_recognizer()
         self.faiss_db = get_faiss_db()
+        self.search_batcher = get_search_batcher()
     
     def process_student_frames(
         self,
         frames: List[np.ndarray],
         student_id: int,
-        min_faces: int = 10
+        min_faces: int = 10,
+        replace: bool = False
     ) -> Dict:
         """
         Process frames for a student and extract embeddings
         
         Args:
-            frames: List of video frames
+            frames: List of video frames, or an (N, H, W, 3) array
             student_id: Student ID
             min_faces: Minimum number of valid faces required
+            replace: Replace the student's existing embeddings (only once the
+                new ones are ready; on failure the old ones are kept)
             
         Returns:
             Dictionary with processing results
         """
-        embeddings = []
-        valid_frames = 0
+        face_imgs = []
+        
+        logger.info("Processing %d frames for student %d", len(frames), student_id)
         
-        print(f"Processing {len(frames)} frames for student {student_id}")
+        # Detect faces in all frames with concurrent session runs
+        try:
+            detections = self.detector.detect_many(frames, tiled=settings.DETECTION_TILING)
+        except Exception as e:
+            logger.warning("Concurrent detection failed (%s), retrying per frame", e)
+            detections = [None] * len(frames)
         
         for i, frame in enumerate(frames):
             try:
                 # Detect faces
-                faces = self.detector.detect(frame)
+                faces = detections[i] if detections[i] is not None else self.detector.detect(frame)
                 
                 if len(faces) == 0:
-                    print(f"Frame {i}: No faces detected")
+                    logger.debug("Frame %d: No faces detected", i)
                     continue
                 
                 # Use the face with highest confidence
                 best_face = max(faces, key=lambda x: x['score'])
-                print(f"Frame {i}: Detected face with score {best_face['score']:.3f}")
+                logger.debug("Frame %d: Detected face with score %.3f", i, best_face['score'])
                 
                 # Extract face region
-                face_img = self.recognizer.extract_face_from_bbox(
-                    frame, 
-                    best_face['bbox']
-                )
+                face_img = self.recognizer.extract_face(frame, best_face)
                 
                 if face_img is None:
-                    print(f"Frame {i}: Could not extract face region")
+                    logger.debug("Frame %d: Could not extract face region", i)
                     continue
                 
-                # Get embedding
-                try:
-                    embedding = self.recognizer.get_embedding(face_img)
-                    embeddings.append(embedding)
-                    valid_frames += 1
-                    print(f"Frame {i}: Successfully extracted embedding")
-                except Exception as e:
-                    print(f"Frame {i}: Error getting embedding: {e}")
-                    continue
-            except Exception as e:
-                print(f"Frame {i}: Error processing frame: {e}")
-                import traceback
-                traceback.print_exc()
+                face_imgs.append(face_img)
+            except Exception:
+                logger.exception("Frame %d: Error processing frame", i)
                 continue
         
+        # Get embeddings for all extracted faces in batched inference calls
+        embeddings = []
+        if face_imgs:
+            try:
+                embeddings = self.recognizer.get_embeddings(face_imgs)
+                logger.info("Extracted %d embeddings for student %d", len(embeddings), student_id)
+            except Exception as e:
+                # Fall back to one face at a time so a single bad crop doesn't sink the batch
+                logger.warning("Batched embedding failed (%s), retrying per face", e)
+                for i, face_img in enumerate(face_imgs):
+                    try:
+                        embeddings.append(self.recognizer.get_embedding(face_img))
+                    except Exception as face_error:
+                        logger.warning("Face %d: Error getting embedding: %s", i, face_error)
+        valid_frames = len(embeddings)
+        
         # Check if we have enough valid faces
         if len(embeddings) < min_faces:
             return {
@@ -92,11 +108,14 @@ class FaceRecognitionTrainer:
         
         # Add embeddings to FAISS
         try:
-            self.faiss_db.add_multiple_embeddings(
-                embeddings,
-                student_id,
-                metadata={'num_embeddings': len(embeddings)}
-            )
+            # Switch to the configured quantized index once there is enough data
+            self.faiss_db.train_if_needed(embeddings)
+            # min_faces is kept so retraining applies the same threshold
+            metadata = {'num_embeddings': len(embeddings), 'min_faces': min_faces}
+            if replace:
+                self.faiss_db.replace_student_embeddings(embeddings, student_id, metadata)
+            else:
+                self.faiss_db.add_batch(embeddings, student_id, metadata)
             
             return {
                 'success': True,
@@ -111,78 +130,106 @@ class FaceRecognitionTrainer:
                 'embeddings_count': len(embeddings)
             }
     
-    def recognize_face(self, frame: np.ndarray) -> List[Dict]:
+    def recognize_face(self, frame: np.ndarray, detection_cache: DetectionCache = None) -> List[Dict]:
         """
         Recognize faces in a frame
         
         Args:
             frame: Video frame
+            detection_cache: Per-stream cache used to skip detection on static frames
             
         Returns:
             List of recognized faces with student IDs and confidence
         """
         results = []
         
-        print(f"[RECOGNITION] Starting face recognition on frame shape: {frame.shape}")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Starting face recognition on frame shape: %s", frame.shape)
+        
+        # Pick up students enrolled through other workers
+        self.faiss_db.reload_if_stale()
         
         # Detect faces
         try:
-            faces = self.detector.detect(frame)
-            print(f"[RECOGNITION] Detected {len(faces)} faces")
+            detector = detection_cache or self.detector
+            faces = detector.detect(frame)
+            logger.debug("Detected %d faces", len(faces))
         except Exception as e:
-            print(f"[RECOGNITION] Error detecting faces: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error detecting faces: %s", e)
             return results
         
+        # Crop every detected face, then embed them all in one inference call
+        crops = []
         for i, face in enumerate(faces):
-            print(f"[RECOGNITION] Processing face {i+1}/{len(faces)}, bbox={face['bbox']}, score={face['score']:.3f}")
+            if debug:
+                logger.debug("Processing face %d/%d, bbox=%s, score=%.3f", i + 1, len(faces), face['bbox'], face['score'])
             
             # Extract face region
-            face_img = self.recognizer.extract_face_from_bbox(
-                frame,
-                face['bbox']
-            )
+            face_img = self.recognizer.extract_face(frame, face)
             
             if face_img is None:
-                print(f"[RECOGNITION] Face {i+1}: Could not extract face region")
+                logger.debug("Face %d: Could not extract face region", i + 1)
                 continue
             
-            print(f"[RECOGNITION] Face {i+1}: Extracted face region, shape={face_img.shape}")
+            crops.append((i, face, face_img))
+        
+        if not crops:
+            return results
+        
+        try:
+            # A whole frame's faces go through a single session.run (not split into
+            # TRAINING_BATCH_SIZE minibatches), so a crowded classroom frame costs
+            # one kernel launch and host-to-device copy instead of several
+            embeddings = self.recognizer.get_embeddings(
+                [face_img for _, _, face_img in crops],
+                batch_size=len(crops)
+            )
+            logger.debug("Got %d embeddings in one batch", len(embeddings))
+        except Exception as e:
+            # Fall back to one face at a time so a single bad crop doesn't sink the frame
+            logger.warning("Batched embedding failed (%s), retrying per face", e)
+            embeddings = []
+            for i, _, face_img in crops:
+                try:
+                    embeddings.append(self.recognizer.get_embedding(face_img))
+                except Exception as face_error:
+                    logger.warning("Face %d: Error getting embedding: %s", i + 1, face_error)
+                    embeddings.append(None)
             
-            # Get embedding
-            try:
-                embedding = self.recognizer.get_embedding(face_img)
-                print(f"[RECOGNITION] Face {i+1}: Got embedding, shape={embedding.shape}")
-                
-                # Search in FAISS
-                matches = self.faiss_db.search(embedding, k=1)
-                print(f"[RECOGNITION] Face {i+1}: FAISS search returned {len(matches) if matches else 0} matches")
-                
-                if matches:
-                    student_id, confidence = matches[0]
-                    print(f"[RECOGNITION] Face {i+1}: Matched student_id={student_id}, confidence={confidence:.3f}")
-                    results.append({
-                        'bbox': face['bbox'],
-                        'student_id': student_id,
-                        'confidence': confidence,
-                        'detection_score': face['score']
-                    })
-                else:
-                    print(f"[RECOGNITION] Face {i+1}: No match found (unknown face)")
-                    results.append({
-                        'bbox': face['bbox'],
-                        'student_id': None,
-                        'confidence': 0.0,
-                        'detection_score': face['score']
-                    })
-            except Exception as e:
-                print(f"[RECOGNITION] Face {i+1}: Error recognizing face: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+            crops = [crop for crop, embedding in zip(crops, embeddings) if embedding is not None]
+            if not crops:
+                return results
+            embeddings = np.stack([embedding for embedding in embeddings if embedding is not None])
+        
+        try:
+            # Search in FAISS, all faces in one call (shared with faces from
+            # concurrent requests and camera workers)
+            all_matches = self.search_batcher.search(embeddings, k=1)
+        except Exception as e:
+            logger.exception("Error searching FAISS: %s", e)
+            return results
+        
+        for (i, face, _), matches in zip(crops, all_matches):
+            if matches:
+                student_id, confidence = matches[0]
+                logger.debug("Face %d: Matched student_id=%d, confidence=%.3f", i + 1, student_id, confidence)
+                results.append({
+                    'bbox': face['bbox'],
+                    'student_id': student_id,
+                    'confidence': confidence,
+                    'detection_score': face['score']
+                })
+            else:
+                logger.debug("Face %d: No match found (unknown face)", i + 1)
+                results.append({
+                    'bbox': face['bbox'],
+                    'student_id': None,
+                    'confidence': 0.0,
+                    'detection_score': face['score']
+                })
         
-        print(f"[RECOGNITION] Completed recognition, returning {len(results)} results")
+        logger.debug("Completed recognition, returning %d results", len(results))
         return results
     
     def remove_student_data(self, student_id: int):
@@ -203,7 +250,7 @@ class FaceRecognitionTrainer:
         """
         return {
             'total_embeddings': self.faiss_db.get_total_embeddings(),
-            'unique_students': len(set(self.faiss_db.student_ids)),
+            'unique_students': self.faiss_db.unique_student_count(),
             'model_path': settings.FAISS_INDEX_PATH,
             'dimension': self.faiss_db.dimension
         }
@@ -222,11 +269,14 @@ class FaceRecognitionTrainer:
         if output_path is None:
             output_path = os.path.join(settings.MODELS_PATH, 'face_recognition_model.pkl')
         
+        # The export points at the index file, so fold any WAL entries into it first
+        self.faiss_db.save_index()
+        
         model_data = {
             'faiss_index_path': self.faiss_db.index_path,
             'embeddings_path': self.faiss_db.embeddings_path,
-            'student_ids': self.faiss_db.student_ids,
-            'embeddings_data': self.faiss_db.embeddings_data,
+            'student_ids': self.faiss_db.student_ids.tolist(),
+            'student_metadata': self.faiss_db.student_metadata,
             'dimension': self.faiss_db.dimension,
             'config': {
                 'detection_threshold': settings.FACE_DETECTION_THRESHOLD,
@@ -239,7 +289,7 @@ class FaceRecognitionTrainer:
         with open(output_path, 'wb') as f:
             pickle.dump(model_data, f)
         
-        print(f"Model exported to {output_path}")
+        logger.info("Model exported to %s", output_path)
         return output_path
 
 
@@ -6,9 +6,8 @@ import cv2
 import numpy as np
 from typing import List, Generator, Optional
 import base64
-from io import BytesIO
-from PIL import Image
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 
 class VideoCapture:
@@ -28,6 +27,7 @@ class VideoCapture:
         self.fps = fps
         self.cap = None
         self.is_opened = False
+        self.is_live = False  # camera or network stream (as opposed to a file)
     
     def open(self) -> bool:
         """Open video capture"""
@@ -35,6 +35,7 @@ class VideoCapture:
             # Try to parse as integer (camera index)
             try:
                 source_int = int(self.source)
+                self.is_live = True
                 # On Windows, prefer DirectShow to avoid MSMF issues
                 if os.name == 'nt':
                     self.cap = cv2.VideoCapture(source_int, cv2.CAP_DSHOW)
@@ -48,6 +49,7 @@ class VideoCapture:
                 src = str(self.source)
                 # Prefer FFMPEG for network streams (HTTP/RTSP) for better compatibility
                 if src.startswith("rtsp://") or src.startswith("http://") or src.startswith("https://"):
+                    self.is_live = True
                     self.cap = cv2.VideoCapture(src, cv2.CAP_FFMPEG)
                     if not self.cap.isOpened():
                         # Fallback to default backend
@@ -59,6 +61,9 @@ class VideoCapture:
                 self.is_opened = True
                 # Set FPS
                 self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+                if self.is_live:
+                    # Keep the driver queue short so grabbed frames are live, not stale
+                    self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
                 return True
             return False
         except Exception as e:
@@ -86,6 +91,32 @@ class VideoCapture:
             return frame
         return None
     
+    def grab(self) -> bool:
+        """
+        Advance to the next frame without decoding it
+        
+        Returns:
+            True if a frame was grabbed
+        """
+        if not self.is_opened:
+            return False
+        return self.cap.grab()
+    
+    def retrieve(self) -> Optional[np.ndarray]:
+        """
+        Decode the most recently grabbed frame
+        
+        Returns:
+            Frame as numpy array or None if failed
+        """
+        if not self.is_opened:
+            return None
+        
+        ret, frame = self.cap.retrieve()
+        if ret:
+            return frame
+        return None
+    
     def read_frames(self, num_frames: int) -> List[np.ndarray]:
         """
         Read multiple frames
@@ -150,21 +181,31 @@ def frame_to_base64(frame: np.ndarray, format: str = 'JPEG') -> str:
     Returns:
         Base64 encoded string
     """
-    # Convert BGR to RGB
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    # Encode straight from BGR (libjpeg-turbo / libpng, no RGB conversion or PIL copy)
+    ext = '.jpg' if format.upper() in ('JPEG', 'JPG') else '.' + format.lower()
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), 85] if ext == '.jpg' else []
+    ok, buffer = cv2.imencode(ext, frame, params)
+    if not ok:
+        raise ValueError(f"Failed to encode frame as {format}")
     
-    # Convert to PIL Image
-    pil_img = Image.fromarray(rgb_frame)
-    
-    # Save to bytes buffer
-    buffer = BytesIO()
-    pil_img.save(buffer, format=format)
-    buffer.seek(0)
+    # Encode to base64 (7-bit output, so ASCII)
+    return base64.b64encode(buffer).decode('ascii')
+
+
+def bytes_to_frame(data: bytes) -> Optional[np.ndarray]:
+    """
+    Decode encoded image bytes (JPEG, PNG, ...) to a frame
     
-    # Encode to base64
-    img_base64 = base64.b64encode(buffer.read()).decode('utf-8')
+    The bytes are wrapped with np.frombuffer (a zero-copy view), so the only
+    allocation is the decoded image itself.
     
-    return img_base64
+    Args:
+        data: Encoded image bytes
+        
+    Returns:
+        Image frame (BGR) or None if the data is not a decodable image
+    """
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
 
 
 def base64_to_frame(base64_str: str) -> np.ndarray:
@@ -182,23 +223,50 @@ def base64_to_frame(base64_str: str) -> np.ndarray:
         if ',' in base64_str and base64_str.startswith('data:'):
             base64_str = base64_str.split(',', 1)[1]
         
-        # Decode base64
-        img_bytes = base64.b64decode(base64_str)
-        
-        # Convert to PIL Image
-        pil_img = Image.open(BytesIO(img_bytes))
-        
-        # Convert to numpy array
-        rgb_frame = np.array(pil_img)
-        
-        # Convert RGB to BGR
-        bgr_frame = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2BGR)
+        # Decode base64, then straight to BGR (libjpeg-turbo backed, releases the GIL)
+        bgr_frame = bytes_to_frame(base64.b64decode(base64_str))
+        if bgr_frame is None:
+            raise ValueError("unsupported or corrupt image data")
+        # IMREAD_COLOR yields 8-bit BGR, which SCRFD/ArcFace consume without conversion
+        assert bgr_frame.ndim == 3 and bgr_frame.shape[2] == 3 and bgr_frame.dtype == np.uint8
         
         return bgr_frame
     except Exception as e:
         raise ValueError(f"Failed to decode base64 image: {str(e)}")
 
 
+def base64_to_frames(base64_strs: List[str], max_workers: Optional[int] = None) -> List[np.ndarray]:
+    """
+    Convert a batch of base64 strings to frames in parallel
+    
+    Args:
+        base64_strs: Base64 encoded images
+        max_workers: Decoder threads (defaults to CPU count)
+        
+    Returns:
+        Image frames (BGR), in input order
+        
+    Raises:
+        ValueError: If any frame fails to decode (message names the frame index)
+    """
+    if not base64_strs:
+        return []
+    
+    def decode(item):
+        i, base64_str = item
+        try:
+            return base64_to_frame(base64_str)
+        except ValueError as e:
+            raise ValueError(f"Failed to decode frame {i}: {str(e)}")
+    
+    workers = min(len(base64_strs), max_workers or os.cpu_count() or 1)
+    if workers == 1:
+        return [decode(item) for item in enumerate(base64_strs)]
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(decode, enumerate(base64_strs)))
+
+
 def extract_frames_from_video(
     video_source: str,
     num_frames: int = 50,
@@ -207,10 +275,15 @@ def extract_frames_from_video(
     """
     Extract frames from video source
     
+    For files with a known frame count, frames are sampled evenly across the
+    whole video. Otherwise every (skip_frames + 1)-th frame is taken from the
+    start. Only sampled frames are decoded; the rest are just grabbed.
+    
     Args:
         video_source: Video file path or camera source
         num_frames: Number of frames to extract
-        skip_frames: Number of frames to skip between extractions
+        skip_frames: Number of frames to skip between extractions (used when
+            the frame count is unknown)
         
     Returns:
         List of extracted frames
@@ -221,15 +294,31 @@ def extract_frames_from_video(
         if not cap.is_opened:
             raise ValueError(f"Could not open video source: {video_source}")
         
-        frame_count = 0
+        total = cap.get_frame_count()
+        if total > 0:
+            targets = set(np.linspace(0, total - 1, min(num_frames, total)).astype(int).tolist())
+            last_target = max(targets)
+        else:
+            targets = None
+            last_target = None
+        
+        frame_idx = 0
         while len(frames) < num_frames:
-            frame = cap.read()
-            if frame is None:
+            if last_target is not None and frame_idx > last_target:
+                break
+            if not cap.grab():
                 break
             
-            if frame_count % (skip_frames + 1) == 0:
-                frames.append(frame)
+            if targets is not None:
+                wanted = frame_idx in targets
+            else:
+                wanted = frame_idx % (skip_frames + 1) == 0
+            
+            if wanted:
+                frame = cap.retrieve()
+                if frame is not None:
+                    frames.append(frame)
             
-            frame_count += 1
+            frame_idx += 1
     
     return frames
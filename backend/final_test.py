@@ -11,19 +11,51 @@ import cv2
 import numpy as np
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from app.services.face_detection import get_detector
 from app.services.face_recognition import get_recognizer
 from app.services.training_service import get_trainer
 
-def test_backend_api():
+BASE_URL = "http://localhost:8000"
+FRONTEND_URL = "http://localhost:3000"
+
+# Every HTTP check, fetched concurrently so the status check costs one round trip
+CHECK_URLS = {
+    "health": f"{BASE_URL}/health",
+    "cameras": f"{BASE_URL}/api/v1/cameras",
+    "stats": f"{BASE_URL}/api/v1/recognition/stats",
+    "frontend": FRONTEND_URL,
+}
+
+def fetch_checks(names=None):
+    """GET the named CHECK_URLS in parallel; returns name -> response (or the exception raised)"""
+    names = names or list(CHECK_URLS)
+    
+    def fetch(name):
+        try:
+            return requests.get(CHECK_URLS[name], timeout=10)
+        except Exception as e:
+            return e
+    
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        return dict(zip(names, pool.map(fetch, names)))
+
+def _response(responses, name):
+    """Get a fetched response, re-raising the error if the request failed"""
+    response = responses[name]
+    if isinstance(response, Exception):
+        raise response
+    return response
+
+def test_backend_api(responses=None):
     """Test all backend API endpoints"""
     print("Testing Backend API...")
     
-    base_url = "http://localhost:8000"
+    responses = responses or fetch_checks(["health", "cameras", "stats"])
     
     # Test health endpoint
     try:
-        response = requests.get(f"{base_url}/health")
+        response = _response(responses, "health")
         if response.status_code == 200:
             print("Health check: OK")
         else:
@@ -35,7 +67,7 @@ def test_backend_api():
     
     # Test cameras endpoint
     try:
-        response = requests.get(f"{base_url}/api/v1/cameras")
+        response = _response(responses, "cameras")
         if response.status_code == 200:
             cameras = response.json()
             print(f"Cameras API: OK ({len(cameras)} cameras)")
@@ -48,7 +80,7 @@ def test_backend_api():
     
     # Test recognition stats
     try:
-        response = requests.get(f"{base_url}/api/v1/recognition/stats")
+        response = _response(responses, "stats")
         if response.status_code == 200:
             stats = response.json()
             print(f"Recognition Stats: OK (Embeddings: {stats['total_embeddings']}, Students: {stats['unique_students']})")
@@ -124,14 +156,16 @@ def test_webcam_detection():
         print(f"Webcam Detection: ERROR - {e}")
         return False
 
-def test_frontend_connection():
+def test_frontend_connection(responses=None):
     """Test frontend connection"""
     print("\nTesting Frontend Connection...")
     
+    responses = responses or fetch_checks(["frontend"])
+    
     try:
-        response = requests.get("http://localhost:3000")
+        response = _response(responses, "frontend")
         if response.status_code == 200:
-            print("Frontend: Running on http://localhost:3000")
+            print(f"Frontend: Running on {FRONTEND_URL}")
             return True
         else:
             print("Frontend: Not responding")
@@ -146,11 +180,12 @@ def show_system_status():
     print("FACE RECOGNITION SYSTEM - FINAL STATUS")
     print("="*60)
     
-    # Test all components
-    api_ok = test_backend_api()
+    # Test all components (the four HTTP checks are fetched up front, concurrently)
+    responses = fetch_checks()
+    api_ok = test_backend_api(responses)
     services_ok = test_face_services()
     webcam_ok = test_webcam_detection()
-    frontend_ok = test_frontend_connection()
+    frontend_ok = test_frontend_connection(responses)
     
     print("\n" + "="*60)
     print("SYSTEM SUMMARY")
@@ -0,0 +1,47 @@
+"""
+Gunicorn configuration for production deployment
+Run from the backend directory:
+    gunicorn -c gunicorn_conf.py main:app
+"""
+
+import os
+import multiprocessing
+
+# Server socket
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Worker processes (override with WEB_CONCURRENCY)
+# Every worker holds its own ONNX sessions, so on a single GPU keep this small
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Recognition and training requests can exceed the 30s default
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app once in the master so workers share its pages copy-on-write
+preload_app = True
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """Reset state that must not be shared across forked workers"""
+    from app.core.database import engine
+    from app.core.logging import setup_logging
+    # Connections opened in the master must not be reused by children
+    engine.dispose(close=False)
+    # The master's log listener thread is not forked; start this worker's own
+    setup_logging()
+
+
+def post_worker_init(worker):
+    """Build the trainer inside each worker"""
+    # ONNX Runtime sessions and CUDA contexts (including a GPU FAISS index)
+    # are not fork-safe, so the detector, recognizer and FAISS index are
+    # created after the fork, not in the master; each worker keeps its index
+    # current with reload_if_stale
+    from app.services.training_service import get_trainer
+    get_trainer()
@@ -3,23 +3,41 @@ Main FastAPI application entry point
 Real-time Face Recognition and Attendance System
 """
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-import os
+import anyio
 
-from app.core.config import settings
+from app.core.config import settings, init_storage
+from app.core.logging import setup_logging
 from app.core.database import engine, Base
 from app.api.v1.api import api_router
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+setup_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync routes and offloaded recognition share AnyIO's default worker thread pool
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREAD_POOL_SIZE
+    
+    # Create database tables once the server starts, not at import time, and
+    # off the event loop (importing main must not need a database connection)
+    if settings.CREATE_TABLES_ON_STARTUP:
+        await asyncio.to_thread(Base.metadata.create_all, bind=engine)
+    
+    yield
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    description="Real-time Face Recognition and Attendance System"
+    description="Real-time Face Recognition and Attendance System",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -35,8 +53,8 @@ app.add_middleware(
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 # Mount static files for uploads
-os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+init_storage()
+app.mount("/uploads", StaticFiles(directory=settings.UPLOADS_PATH), name="uploads")
 
 
 @app.get("/")
@@ -0,0 +1,109 @@
+"""
+Index migration script
+Run this to add the indexes declared on the models to an existing database.
+create_all() only creates missing tables, so databases initialized before the
+indexes were added to the models need this once.
+
+On PostgreSQL the indexes are built CONCURRENTLY, so the API and camera
+workers can keep writing attendance while the migration runs. Column server
+defaults added to the models after initialization are applied as well.
+"""
+
+import sys
+import os
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from app.core.database import engine, Base
+from app.models import Student, Attendance, Camera, Admin
+
+
+def dedupe_attendance(conn) -> int:
+    """
+    Remove duplicate (student_id, date) attendance rows, keeping the earliest
+
+    Required before the unique index can be built on databases that recorded
+    duplicates under the old check-then-insert marking.
+
+    Returns:
+        Number of rows deleted
+    """
+    result = conn.execute(text(
+        "DELETE FROM attendance a USING attendance b "
+        "WHERE a.student_id = b.student_id AND a.date = b.date AND a.id > b.id"
+    ))
+    return result.rowcount
+
+
+def apply_server_defaults(conn):
+    """Apply column server defaults declared on the models to existing tables"""
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            default = column.server_default
+            if default is None or not hasattr(default, "arg"):
+                continue
+            arg = default.arg
+            sql = arg if isinstance(arg, str) else str(arg.compile(dialect=engine.dialect))
+            conn.execute(text(
+                f'ALTER TABLE {table.name} ALTER COLUMN "{column.name}" SET DEFAULT {sql}'
+            ))
+            print(f"  ✓ {table.name}.{column.name} DEFAULT {sql}")
+
+
+def migrate_indexes():
+    """Create any model indexes that are missing from the database"""
+    print("Creating missing indexes...")
+
+    is_postgres = engine.dialect.name == "postgresql"
+
+    try:
+        inspector = inspect(engine)
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in Base.metadata.sorted_tables:
+                existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+
+                for index in table.indexes:
+                    if index.name in existing:
+                        print(f"  - {table.name}.{index.name} (exists)")
+                        continue
+
+                    if index.name == "ix_attendance_student_date":
+                        removed = dedupe_attendance(conn)
+                        if removed:
+                            print(f"  ✓ Removed {removed} duplicate attendance rows")
+
+                    ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+                    if is_postgres:
+                        ddl = ddl.replace("INDEX ", "INDEX CONCURRENTLY ", 1)
+                    conn.execute(text(ddl))
+                    print(f"  ✓ {table.name}.{index.name}")
+            
+            print("\nApplying column defaults...")
+            apply_server_defaults(conn)
+
+        print("\nIndex migration complete!")
+
+    except Exception as e:
+        print(f"✗ Error creating indexes: {e}")
+        print("\nPlease check:")
+        print("1. PostgreSQL is running")
+        print("2. Database credentials in .env are correct")
+        print("3. No index was left INVALID by an interrupted run (drop it and re-run)")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Face Recognition Attendance System")
+    print("Index Migration")
+    print("=" * 50)
+    print()
+
+    migrate_indexes()
@@ -0,0 +1,201 @@
+"""
+Model quantization script
+Builds reduced-precision variants of the ArcFace recognition model:
+  - INT8 (dynamic quantization) for CPU deployments
+  - FP16 for CUDA deployments (inputs/outputs stay float32)
+
+Point ARCFACE_MODEL_PATH in .env at the variant to use. Embeddings are
+re-normalized after inference, so the FP32 cosine FAISS index keeps working,
+but re-enroll students if recognition scores shift noticeably.
+
+With --detector, builds variants of the SCRFD detection model instead:
+  - INT8 (static QDQ quantization, calibrated on enrollment photos from the
+    uploads directory) for CPU deployments
+  - FP16 for CUDA deployments
+Point SCRFD_MODEL_PATH in .env at the variant to use.
+
+FP16 models run on Tensor Cores when the CUDA provider is active.
+"""
+
+import sys
+import os
+import glob
+import argparse
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import cv2
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    quantize_dynamic, quantize_static, QuantType, QuantFormat, CalibrationDataReader
+)
+from onnxruntime.transformers.float16 import convert_float_to_float16
+
+from app.core.config import settings
+
+
+def variant_path(model_path: str, suffix: str) -> str:
+    """Path for a model variant, e.g. models/w600k_r50.int8.onnx"""
+    base, ext = os.path.splitext(model_path)
+    return f"{base}.{suffix}{ext}"
+
+
+def quantize_int8(model_path: str) -> str:
+    """Quantize model weights to INT8 (activations quantized at runtime)"""
+    output_path = variant_path(model_path, "int8")
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+    return output_path
+
+
+def convert_fp16(model_path: str) -> str:
+    """Convert model weights and compute to FP16, keeping FP32 inputs/outputs"""
+    output_path = variant_path(model_path, "fp16")
+    model = onnx.load(model_path)
+    model_fp16 = convert_float_to_float16(model, keep_io_types=True)
+    onnx.save(model_fp16, output_path)
+    return output_path
+
+
+class DetectorCalibrationReader(CalibrationDataReader):
+    """Feeds letterboxed calibration images to the SCRFD model, preprocessed like SCRFDDetector"""
+
+    def __init__(self, model_path: str, image_paths: list):
+        model_input = ort.InferenceSession(model_path, providers=['CPUExecutionProvider']).get_inputs()[0]
+        self.input_name = model_input.name
+        height, width = model_input.shape[2:]
+        self.input_height = height if isinstance(height, int) else 640
+        self.input_width = width if isinstance(width, int) else 640
+        self.image_paths = iter(image_paths)
+
+    def _preprocess(self, image: np.ndarray) -> np.ndarray:
+        img_h, img_w = image.shape[:2]
+        scale = min(self.input_height / img_h, self.input_width / img_w)
+        new_h, new_w = int(img_h * scale), int(img_w * scale)
+        padded = np.zeros((self.input_height, self.input_width, 3), dtype=np.uint8)
+        padded[:new_h, :new_w] = cv2.resize(image, (new_w, new_h))
+        return cv2.dnn.blobFromImage(
+            padded,
+            scalefactor=1.0 / 128.0,
+            size=(self.input_width, self.input_height),
+            mean=(127.5, 127.5, 127.5),
+            swapRB=True,
+            crop=False
+        )
+
+    def get_next(self):
+        for path in self.image_paths:
+            image = cv2.imread(path)
+            if image is not None:
+                return {self.input_name: self._preprocess(image)}
+        return None
+
+
+def find_calibration_images(calibration_dir: str, limit: int) -> list:
+    """Collect up to `limit` images from the calibration directory (recursive)"""
+    paths = []
+    for ext in ("jpg", "jpeg", "png", "bmp", "webp"):
+        paths.extend(glob.glob(os.path.join(calibration_dir, "**", f"*.{ext}"), recursive=True))
+    return sorted(paths)[:limit]
+
+
+def quantize_detector_int8(model_path: str, calibration_dir: str, num_images: int) -> bool:
+    """Statically quantize the detector (QDQ, INT8 weights and activations)"""
+    print(f"Source model: {model_path}")
+
+    if not os.path.exists(model_path):
+        print(f"✗ Model not found at {model_path}")
+        return False
+
+    image_paths = find_calibration_images(calibration_dir, num_images)
+    if not image_paths:
+        print(f"✗ No calibration images found in {calibration_dir}")
+        print("  Enroll a few students with photos first, or pass --calibration-dir")
+        return False
+    print(f"Calibrating on {len(image_paths)} images from {calibration_dir}")
+
+    source_size = os.path.getsize(model_path) / (1024 * 1024)
+    output_path = variant_path(model_path, "int8")
+
+    try:
+        quantize_static(
+            model_path,
+            output_path,
+            calibration_data_reader=DetectorCalibrationReader(model_path, image_paths),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QInt8,
+            weight_type=QuantType.QInt8
+        )
+
+        size = os.path.getsize(output_path) / (1024 * 1024)
+        print(f"  ✓ int8: {output_path} ({source_size:.1f} MB -> {size:.1f} MB)")
+
+        print("\nQuantization complete!")
+        print("\nNext steps:")
+        print("1. Set SCRFD_MODEL_PATH in .env to the int8 variant")
+        print("2. Restart the FastAPI server")
+
+    except Exception as e:
+        print(f"✗ Error quantizing model: {e}")
+        return False
+
+    return True
+
+
+def quantize_models(model_path: str, formats: list, env_var: str = "ARCFACE_MODEL_PATH"):
+    """Build the requested model variants"""
+    print(f"Source model: {model_path}")
+
+    if not os.path.exists(model_path):
+        print(f"✗ Model not found at {model_path}")
+        return False
+
+    source_size = os.path.getsize(model_path) / (1024 * 1024)
+
+    try:
+        for fmt in formats:
+            if fmt == "int8":
+                output_path = quantize_int8(model_path)
+            else:
+                output_path = convert_fp16(model_path)
+
+            size = os.path.getsize(output_path) / (1024 * 1024)
+            print(f"  ✓ {fmt}: {output_path} ({source_size:.1f} MB -> {size:.1f} MB)")
+
+        print("\nQuantization complete!")
+        print("\nNext steps:")
+        print(f"1. Set {env_var} in .env to the variant to use")
+        print("   (int8 for CPU servers, fp16 for CUDA servers)")
+        print("2. Restart the FastAPI server")
+
+    except Exception as e:
+        print(f"✗ Error quantizing model: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build INT8/FP16 variants of the ArcFace model, or an INT8 SCRFD model")
+    parser.add_argument("--model", help="Source FP32 ONNX model (default: ARCFACE_MODEL_PATH, or SCRFD_MODEL_PATH with --detector)")
+    parser.add_argument("--formats", nargs="+", choices=["int8", "fp16"], default=["int8", "fp16"])
+    parser.add_argument("--detector", action="store_true", help="Build variants of the SCRFD detector (static INT8, FP16)")
+    parser.add_argument("--calibration-dir", default=settings.UPLOADS_PATH, help="Images used to calibrate the detector")
+    parser.add_argument("--calibration-size", type=int, default=200, help="Maximum number of calibration images")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Face Recognition Attendance System")
+    print("Model Quantization")
+    print("=" * 50)
+    print()
+
+    if args.detector:
+        model_path = args.model or settings.SCRFD_MODEL_PATH
+        if "int8" in args.formats:
+            quantize_detector_int8(model_path, args.calibration_dir, args.calibration_size)
+        if "fp16" in args.formats:
+            quantize_models(model_path, ["fp16"], env_var="SCRFD_MODEL_PATH")
+    else:
+        quantize_models(args.model or settings.ARCFACE_MODEL_PATH, args.formats)
@@ -44,16 +44,15 @@ def test_face_recognition():
     
     trainer = get_trainer()
     
-    # Create test frames with synthetic faces
-    frames = []
-    for i in range(3):
-        img = np.zeros((480, 640, 3), dtype=np.uint8)
-        # Draw a simple face
-        cv2.circle(img, (320, 200), 80, (255, 255, 255), -1)
-        cv2.circle(img, (300, 180), 10, (0, 0, 0), -1)
-        cv2.circle(img, (340, 180), 10, (0, 0, 0), -1)
-        cv2.ellipse(img, (320, 220), (20, 10), 0, 0, 180, (0, 0, 0), 2)
-        frames.append(img)
+    # Create test frames with a synthetic face (drawn once; the pipeline
+    # only reads frames, so the three entries can share one array)
+    img = np.zeros((480, 640, 3), dtype=np.uint8)
+    # Draw a simple face
+    cv2.circle(img, (320, 200), 80, (255, 255, 255), -1)
+    cv2.circle(img, (300, 180), 10, (0, 0, 0), -1)
+    cv2.circle(img, (340, 180), 10, (0, 0, 0), -1)
+    cv2.ellipse(img, (320, 220), (20, 10), 0, 0, 180, (0, 0, 0), 2)
+    frames = [img] * 3
     
     # Test training
     result = trainer.process_student_frames(frames, 1, min_faces=1)
@@ -83,24 +82,30 @@ def test_with_webcam():
     
     frame_count = 0
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        # grab() only demuxes; frames that aren't processed are never decoded
+        if not cap.grab():
             break
         
         frame_count += 1
         
         # Detect faces every 10 frames to avoid performance issues
-        if frame_count % 10 == 0:
-            faces = detector.detect(frame)
-            print(f"Frame {frame_count}: Detected {len(faces)} faces")
-            
-            if faces:
-                # Draw faces
-                for face in faces:
-                    bbox = face['bbox']
-                    cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
-                    cv2.putText(frame, f"{face['score']:.2f}", (bbox[0], bbox[1]-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        if frame_count % 10 != 0:
+            continue
+        
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        
+        faces = detector.detect(frame)
+        print(f"Frame {frame_count}: Detected {len(faces)} faces")
+        
+        if faces:
+            # Draw faces
+            for face in faces:
+                bbox = face['bbox']
+                cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
+                cv2.putText(frame, f"{face['score']:.2f}", (bbox[0], bbox[1]-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
         
         cv2.imshow('Face Detection Test', frame)
         
@@ -30,32 +30,40 @@ def test_real_face_recognition():
     frame_count = 0
     
     while len(frames) < 10:  # Capture 10 frames
-        ret, frame = cap.read()
-        if not ret:
+        # grab() only demuxes; frames that aren't processed are never decoded
+        if not cap.grab():
             break
         
         frame_count += 1
         
         # Detect faces every 5 frames
-        if frame_count % 5 == 0:
-            faces = trainer.detector.detect(frame)
-            if faces:
-                print(f"Frame {frame_count}: Detected {len(faces)} faces")
-                # Draw faces
-                for face in faces:
-                    bbox = face['bbox']
-                    cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
-                    cv2.putText(frame, f"{face['score']:.2f}", (bbox[0], bbox[1]-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        if frame_count % 5 != 0:
+            continue
+        
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
         
-        cv2.imshow('Face Recognition Test', frame)
+        # Draw on a copy so captured training frames stay clean
+        display = frame.copy()
+        faces = trainer.detector.detect(frame)
+        if faces:
+            print(f"Frame {frame_count}: Detected {len(faces)} faces")
+            # Draw faces
+            for face in faces:
+                bbox = face['bbox']
+                cv2.rectangle(display, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
+                cv2.putText(display, f"{face['score']:.2f}", (bbox[0], bbox[1]-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        
+        cv2.imshow('Face Recognition Test', display)
         
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q'):
             break
         elif key == ord('c'):
             # Capture frame for training
-            frames.append(frame.copy())
+            frames.append(frame)
             print(f"Captured frame {len(frames)}/10")
     
     cap.release()
@@ -80,31 +88,36 @@ def test_real_face_recognition():
         
         recognition_count = 0
         while recognition_count < 20:  # Test for 20 frames
-            ret, frame = cap.read()
-            if not ret:
+            if not cap.grab():
                 break
             
             recognition_count += 1
             
             # Recognize faces
-            if recognition_count % 3 == 0:  # Every 3rd frame
-                results = trainer.recognize_face(frame)
-                
-                # Draw results
-                for result in results:
-                    bbox = result['bbox']
-                    if result['student_id'] is not None:
-                        color = (0, 255, 0)  # Green for recognized
-                        text = f"Student {result['student_id']} ({result['confidence']:.2f})"
-                    else:
-                        color = (0, 0, 255)  # Red for unknown
-                        text = "Unknown"
-                    
-                    cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), color, 2)
-                    cv2.putText(frame, text, (bbox[0], bbox[1]-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+            if recognition_count % 3 != 0:  # Every 3rd frame
+                continue
+            
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            
+            results = trainer.recognize_face(frame)
+            
+            # Draw results
+            for result in results:
+                bbox = result['bbox']
+                if result['student_id'] is not None:
+                    color = (0, 255, 0)  # Green for recognized
+                    text = f"Student {result['student_id']} ({result['confidence']:.2f})"
+                else:
+                    color = (0, 0, 255)  # Red for unknown
+                    text = "Unknown"
                 
-                print(f"Recognition frame {recognition_count}: {len(results)} faces detected")
+                cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), color, 2)
+                cv2.putText(frame, text, (bbox[0], bbox[1]-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+            
+            print(f"Recognition frame {recognition_count}: {len(results)} faces detected")
             
             cv2.imshow('Face Recognition Test', frame)
             
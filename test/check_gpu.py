@@ -2,6 +2,9 @@
 Quick GPU Check Script
 Run this to verify GPU acceleration is working
 """
+import os
+import sys
+
 import onnxruntime as ort
 import torch
 
@@ -31,22 +34,42 @@ if torch.cuda.is_available():
 else:
     print("   ⚠️ PyTorch cannot use GPU")
 
-# Check device info
-print("\n3. ONNX Runtime Device Info:")
+# Check FAISS GPU support (faiss-gpu build)
+print("\n3. FAISS GPU:")
+try:
+    import faiss
+    num_gpus = faiss.get_num_gpus() if hasattr(faiss, 'StandardGpuResources') else 0
+    if num_gpus > 0:
+        print(f"   ✅ FAISS can use {num_gpus} GPU(s)")
+    else:
+        print("   ⚠️ FAISS is CPU-only (install faiss-gpu to search on the GPU)")
+except ImportError:
+    print("   ⚠️ FAISS not installed")
+
+# Check the session settings the backend actually uses
+print("\n4. ONNX Runtime Session (backend settings):")
 try:
-    import onnxruntime as ort
-    sess_options = ort.SessionOptions()
-    providers_with_options = [
-        ('CUDAExecutionProvider', {
-            'device_id': 0,
-            'arena_extend_strategy': 'kNextPowerOfTwo',
-            'gpu_mem_limit': 2 * 1024 * 1024 * 1024,  # 2GB
-            'cudnn_conv_algo_search': 'EXHAUSTIVE',
-            'do_copy_in_default_stream': True,
-        }),
-        'CPUExecutionProvider'
-    ]
-    print("   ✅ GPU session can be created")
+    backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+    sys.path.insert(0, backend_dir)
+    from app.core.config import settings
+    from app.services.onnx_session import create_session_options, cuda_provider
+
+    sess_options = create_session_options()
+    print(f"   intra_op_num_threads: {sess_options.intra_op_num_threads or 'default (one per physical core)'}")
+    print(f"   inter_op_num_threads: {sess_options.inter_op_num_threads}")
+    print(f"   execution_mode: {sess_options.execution_mode}")
+    print(f"   graph_optimization_level: {sess_options.graph_optimization_level}")
+
+    model_path = os.path.join(backend_dir, settings.SCRFD_MODEL_PATH)
+    if os.path.exists(model_path):
+        session = ort.InferenceSession(
+            model_path,
+            sess_options=sess_options,
+            providers=[cuda_provider(), 'CPUExecutionProvider']
+        )
+        print(f"   ✅ Detector session created on {session.get_providers()[0]}")
+    else:
+        print(f"   ⚠️ Detector model not found at {model_path}")
 except Exception as e:
     print(f"   ⚠️ Error creating GPU session: {e}")
 
@@ -0,0 +1,50 @@
+import threading
+import time
+
+import cv2
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Reads a cv2.VideoCapture on a background thread, keeping only the newest frame
+
+    RTSP/H.264 largely ignores CAP_PROP_BUFFERSIZE, so when the consumer is
+    slower than the stream, frames queue inside FFmpeg and latency keeps
+    growing. Draining the stream here bounds latency to one frame.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.latest = None
+        self.frame_id = 0  # incremented for every stored frame
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            if not self.cap.grab():
+                print("⚠️ Frame not received. Retrying...")
+                time.sleep(0.1)
+                continue
+
+            ret, frame = self.cap.retrieve()
+            if ret:
+                with self.lock:
+                    self.latest = frame
+                    self.frame_id += 1
+
+    def read(self):
+        """
+        Returns:
+            (frame_id, copy of the newest frame), or (0, None) before the first frame
+        """
+        with self.lock:
+            if self.latest is None:
+                return 0, None
+            return self.frame_id, self.latest.copy()
+
+    def stop(self):
+        """Stop grabbing; call before cap.release()"""
+        self.stopped.set()
+        self.join(timeout=2)
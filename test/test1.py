@@ -1,6 +1,8 @@
 import cv2
 from insightface.app import FaceAnalysis
 
+from frame_grabber import FrameGrabber
+
 # Initialize FaceAnalysis
 app = FaceAnalysis(providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
 
@@ -18,11 +20,19 @@ if not cap.isOpened():
     print("❌ Failed to open RTSP stream.")
     exit()
 
+# Decode on a background thread; inference always runs on the newest frame
+grabber = FrameGrabber(cap)
+grabber.start()
+last_id = 0
+
 while True:
-    ret, frame = cap.read()
-    if not ret or frame is None:
-        print("⚠️ Frame not received from camera.")
+    frame_id, frame = grabber.read()
+    if frame_id == last_id:
+        # No new frame yet; keep the window responsive
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
         continue
+    last_id = frame_id
 
     # Detect faces
     faces = app.get(frame)
@@ -49,5 +59,6 @@ while True:
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
+grabber.stop()
 cap.release()
 cv2.destroyAllWindows()
\ No newline at end of file